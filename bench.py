@@ -0,0 +1,352 @@
+"""CSC148 Assignment 2
+
+CSC148 Winter 2024
+Department of Computer Science,
+University of Toronto
+
+This code is provided solely for the personal and private use of
+students taking the CSC148 course at the University of Toronto.
+Copying for purposes other than this use is expressly prohibited.
+All forms of distribution of this code, whether as given or with
+any changes, are expressly prohibited.
+
+Authors: Diane Horton, David Liu, Mario Badr, Sophia Huynh, Misha Schwartz,
+Jaisie Sin, and Joonho Kim
+
+All of the files in this directory and all subdirectories are:
+Copyright (c) Diane Horton, David Liu, Mario Badr, Sophia Huynh,
+Misha Schwartz, Jaisie Sin, and Joonho Kim
+
+Module Description:
+
+This file contains a benchmark suite for the hot paths of the game: board
+generation and copying, rotating and swapping, flattening, scoring, finding
+blocks and choosing moves. Each benchmark is run on boards of every depth in
+a range, generated from fixed seeds, and its time, allocations and peak
+memory are reported as JSON. Results can be compared against a baseline
+saved by an earlier run, to catch regressions.
+
+Run it from the command line, for example:
+
+    python bench.py --depths 2 6 --output results.json
+    python bench.py --baseline results.json
+"""
+from __future__ import annotations
+from itertools import cycle
+from typing import Any, Callable, Iterator
+import argparse
+import gc
+import json
+import platform
+import random
+import sys
+import time
+import tracemalloc
+
+from block import Block, generate_board, ROT_CW, SWAP_HORZ, \
+    _block_to_squares
+from goal import BlobGoal, PerimeterGoal, SCORE_TABLE, flatten
+from player import SmartPlayer, _get_block
+from settings import COLOUR_LIST
+
+# The width and height of the boards benchmarks are run on.
+BOARD_SIZE = 750
+
+# The depths of the boards benchmarks are run on by default, inclusive.
+MIN_DEPTH = 2
+MAX_DEPTH = 10
+
+# The SmartPlayer difficulties generate_move is benchmarked at.
+DIFFICULTIES = (1, 10, 50)
+
+# The least time, in seconds, each timed run of a benchmark takes.
+MIN_RUN_SECONDS = 0.02
+
+# How much slower, or how much more peak memory, a benchmark may take than
+# its baseline before it counts as a regression, as a fraction. Timings of
+# the same benchmark in different processes can differ by this much.
+TOLERANCE = 0.5
+
+# How much more peak memory, in bytes, a benchmark may take than its baseline
+# before it counts as a regression, however small its baseline. The peaks of
+# small benchmarks differ by a few kilobytes between processes.
+MEMORY_SLACK = 1 << 16
+
+# A function that gets ready to run a benchmark once and returns the function
+# to time.
+Prepare = Callable[[], Callable[[], Any]]
+
+
+def _levels(board: Block) -> Iterator[tuple[int, Block]]:
+    """Yield the level and the first block with children at each level of
+    <board>, top level first, skipping levels with no such block.
+    """
+    level = [board]
+    while level:
+        parents = [block for block in level if block.children]
+        if parents:
+            yield parents[0].level, parents[0]
+        level = [child for block in parents for child in block.children]
+
+
+def benchmarks(board: Block, seed: int) -> \
+        list[tuple[str, Prepare, int]]:
+    """Return the benchmarks to run on <board>, as tuples of a name, a
+    function that prepares one run and the number of times to call the
+    function it returns in each run.
+
+    Every run that changes or scores a board does so on a fresh copy of
+    <board>, and scoring runs start with an empty SCORE_TABLE, so nothing
+    cached by an earlier run is reused. Rotations and swaps take
+    constant time, so they are called many times in each run. A rotation
+    leaves the positions below the rotated block to be worked out when they
+    are next read, so each is also timed together with rendering the whole
+    board from the root, which reads every position.
+    """
+    def generate() -> Callable[[], Any]:
+        random.seed(seed)
+        return lambda: generate_board(board.max_depth, BOARD_SIZE)
+
+    def copy() -> Callable[[], Any]:
+        return board.create_copy
+
+    def flat() -> Callable[[], Any]:
+        fresh = board.create_copy()
+        return lambda: flatten(fresh)
+
+    def score(goal_class: type) -> Prepare:
+        def prepare() -> Callable[[], Any]:
+            SCORE_TABLE.clear()
+            fresh = board.create_copy()
+            goal = goal_class(COLOUR_LIST[0])
+            return lambda: goal.score(fresh)
+        return prepare
+
+    def move(path: tuple[int, ...], method: str, direction: int,
+             render: bool = False) -> Prepare:
+        def prepare() -> Callable[[], Any]:
+            root = block = board.create_copy()
+            for index in path:
+                block = block.children[index]
+            if render:
+                return lambda: (getattr(block, method)(direction),
+                                _block_to_squares(root))
+            return lambda: getattr(block, method)(direction)
+        return prepare
+
+    def find() -> Callable[[], Any]:
+        rng = random.Random(seed)
+        spots = cycle([(rng.randrange(BOARD_SIZE), rng.randrange(BOARD_SIZE))
+                       for _ in range(100)])
+        return lambda: _get_block(board, next(spots), board.max_depth)
+
+    def choose(difficulty: int) -> Prepare:
+        def prepare() -> Callable[[], Any]:
+            SCORE_TABLE.clear()
+            random.seed(seed)
+            fresh = board.create_copy()
+            player = SmartPlayer(0, BlobGoal(COLOUR_LIST[0]), difficulty)
+
+            def run() -> Any:
+                player.proceed()
+                return player.generate_move(fresh)
+            return run
+        return prepare
+
+    cases = [('generate_board', generate, 1),
+             ('Block.create_copy', copy, 1),
+             ('flatten', flat, 1),
+             ('PerimeterGoal.score', score(PerimeterGoal), 1),
+             ('BlobGoal.score', score(BlobGoal), 1)]
+    for level, block in _levels(board):
+        path = block.path()
+        cases.append((f'Block.rotate[level={level}]',
+                      move(path, 'rotate', ROT_CW), 1000))
+        cases.append((f'Block.swap[level={level}]',
+                      move(path, 'swap', SWAP_HORZ), 1000))
+        cases.append((f'Block.rotate+render[level={level}]',
+                      move(path, 'rotate', ROT_CW, True), 1))
+        cases.append((f'Block.swap+render[level={level}]',
+                      move(path, 'swap', SWAP_HORZ, True), 1))
+    cases.append(('_get_block', find, 100))
+    for difficulty in DIFFICULTIES:
+        cases.append((f'SmartPlayer.generate_move[difficulty={difficulty}]',
+                      choose(difficulty), 1))
+    return cases
+
+
+def measure(prepare: Prepare, number: int, repeat: int) -> dict[str, Any]:
+    """Return the cost of the benchmark <prepare>.
+
+    The benchmark is timed in <repeat> runs, with the garbage collector off.
+    Each run prepares the benchmark and calls the function <prepare> returns
+    <number> times, over and over until at least MIN_RUN_SECONDS have been
+    spent in those calls, so that quick benchmarks are timed over many
+    calls. The benchmark is then prepared once more and called once, to
+    trace its memory.
+
+    Return a dictionary with:
+    - 'seconds': the time per call, in the fastest run
+    - 'allocated_blocks': the number of memory blocks allocated by one call
+      and still in use when it returned, including its return value
+    - 'allocated_bytes': the size of those memory blocks
+    - 'peak_bytes': the most memory allocated by one call at any time
+
+    Preconditions:
+    - number >= 1
+    - repeat >= 1
+    """
+    times = []
+    for _ in range(repeat):
+        calls = 0
+        elapsed = 0.0
+        while elapsed < MIN_RUN_SECONDS:
+            run = prepare()
+            gc_was_enabled = gc.isenabled()
+            gc.disable()
+            try:
+                start = time.perf_counter()
+                for _ in range(number):
+                    run()
+                elapsed += time.perf_counter() - start
+            finally:
+                if gc_was_enabled:
+                    gc.enable()
+            calls += number
+        times.append(elapsed / calls)
+
+    run = prepare()
+    tracemalloc.start()
+    try:
+        result = run()
+        allocated_bytes, peak_bytes = tracemalloc.get_traced_memory()
+        allocated_blocks = sum(
+            stat.count
+            for stat in tracemalloc.take_snapshot().statistics('filename'))
+    finally:
+        tracemalloc.stop()
+    del result
+    return {'seconds': min(times),
+            'allocated_blocks': allocated_blocks,
+            'allocated_bytes': allocated_bytes,
+            'peak_bytes': peak_bytes}
+
+
+def run_benchmarks(min_depth: int = MIN_DEPTH, max_depth: int = MAX_DEPTH,
+                   repeat: int = 5, seed: int = 0) -> dict[str, Any]:
+    """Run every benchmark on a board of each depth from <min_depth> to
+    <max_depth> inclusive, and return the results.
+
+    The board of depth d is generated with random seeded with <seed> + d, so
+    the same arguments always benchmark the same boards. Each benchmark is
+    timed in <repeat> runs, as in measure.
+
+    Return a dictionary with:
+    - 'python': the version of Python the benchmarks ran on
+    - 'seed', 'repeat': <seed> and <repeat>
+    - 'results': one dictionary per benchmark and depth, with its 'name',
+      the 'depth' of the board and the costs from measure
+
+    Preconditions:
+    - 0 <= min_depth <= max_depth
+    - repeat >= 1
+    """
+    results = []
+    for depth in range(min_depth, max_depth + 1):
+        random.seed(seed + depth)
+        board = generate_board(depth, BOARD_SIZE)
+        for name, prepare, number in benchmarks(board, seed + depth):
+            result = {'name': name, 'depth': depth}
+            result.update(measure(prepare, number, repeat))
+            results.append(result)
+    SCORE_TABLE.clear()
+    return {'python': platform.python_version(),
+            'seed': seed,
+            'repeat': repeat,
+            'results': results}
+
+
+def compare(results: dict[str, Any], baseline: dict[str, Any],
+            tolerance: float = TOLERANCE) -> list[dict[str, Any]]:
+    """Return the regressions in <results> from <baseline>, both returned by
+    run_benchmarks.
+
+    A benchmark regresses when its time or its peak memory is more than
+    <tolerance> times greater than in <baseline> on a board of the same
+    depth, and for its peak memory, also more than MEMORY_SLACK bytes
+    greater. Benchmarks missing from <baseline> are not compared.
+
+    Return one dictionary per regression, with the 'name' and 'depth' of the
+    benchmark, the 'metric' that regressed, and its 'baseline' and 'current'
+    values.
+
+    >>> old = {'results': [{'name': 'flatten', 'depth': 2, 'seconds': 1.0,
+    ...                     'peak_bytes': 100}]}
+    >>> new = {'results': [{'name': 'flatten', 'depth': 2, 'seconds': 2.0,
+    ...                     'peak_bytes': 110}]}
+    >>> compare(new, old)
+    [{'name': 'flatten', 'depth': 2, 'metric': 'seconds', 'baseline': 1.0, \
+'current': 2.0}]
+    >>> compare(old, new)
+    []
+    """
+    before = {(result['name'], result['depth']): result
+              for result in baseline['results']}
+    regressions = []
+    for result in results['results']:
+        old = before.get((result['name'], result['depth']))
+        if old is None:
+            continue
+        for metric, slack in (('seconds', 0), ('peak_bytes', MEMORY_SLACK)):
+            if result[metric] > max(old[metric] * (1 + tolerance),
+                                    old[metric] + slack):
+                regressions.append({'name': result['name'],
+                                    'depth': result['depth'],
+                                    'metric': metric,
+                                    'baseline': old[metric],
+                                    'current': result[metric]})
+    return regressions
+
+
+def main(argv: list[str] | None = None) -> int:
+    """Run the benchmarks with the command line arguments <argv>, print or
+    save the results, and return the exit status: 1 if a regression from the
+    baseline was found, and 0 otherwise.
+    """
+    parser = argparse.ArgumentParser(
+        description='Benchmark the hot paths of the game.')
+    parser.add_argument('--depths', type=int, nargs=2,
+                        default=[MIN_DEPTH, MAX_DEPTH],
+                        metavar=('MIN', 'MAX'),
+                        help='the smallest and largest board depths')
+    parser.add_argument('--repeat', type=int, default=5,
+                        help='the number of timed runs of each benchmark')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help='save the results to this file')
+    parser.add_argument('--baseline',
+                        help='compare the results with those in this file')
+    parser.add_argument('--tolerance', type=float, default=TOLERANCE)
+    args = parser.parse_args(argv)
+
+    results = run_benchmarks(args.depths[0], args.depths[1], args.repeat,
+                             args.seed)
+    regressions = []
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as file:
+            baseline = json.load(file)
+        regressions = compare(results, baseline, args.tolerance)
+        results['regressions'] = regressions
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as file:
+            json.dump(results, file, indent=2)
+    else:
+        print(json.dumps(results, indent=2))
+    for regression in regressions:
+        print('{name} on depth {depth}: {metric} went from {baseline} to '
+              '{current}'.format(**regression), file=sys.stderr)
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -22,9 +22,12 @@ Module Description:
 This file contains the Block class, the main data structure used in the game.
 """
 from __future__ import annotations
+from typing import Any, Iterable, Sequence
+import copy
 import random
 import math
 
+from instrument import hot
 from settings import colour_name, COLOUR_LIST
 
 # constants
@@ -33,6 +36,35 @@ ROT_CCW = 3
 SWAP_HORZ = 0
 SWAP_VERT = 1
 
+# Random keys for Block.zobrist_hash, one row per level. Entries 0 to 3
+# weight the hash of each child, entry 4 marks a block with children and
+# entry 5 weights the colour of a leaf. They come from their own generator so
+# hashes are the same in every run and do not disturb the game's randomness.
+_HASH_MASK = (1 << 64) - 1
+_ZOBRIST_RANDOM = random.Random(148)
+_ZOBRIST_KEYS = [[_ZOBRIST_RANDOM.getrandbits(64) | 1 for _ in range(6)]
+                 for _ in range(64)]
+# The hashes of a Block in its four orientations are cached packed into one
+# int, the hash after t more ROT_CW turns in bits 64t to 64t + 63.
+_PACKED_MASK = (1 << 256) - 1
+# The hash of each leaf seen so far, by its colour, in one dictionary for
+# each row of _ZOBRIST_KEYS. Leaves do not cache their own hashes, to save
+# memory.
+_LEAF_HASHES: list[dict[tuple[int, int, int], int]] = \
+    [{} for _ in _ZOBRIST_KEYS]
+
+
+def _turned(hashes: int, turns: int) -> int:
+    """Return the packed <hashes> of a Block after it is turned <turns> more
+    times clockwise.
+
+    >>> hashes = 4 << 192 | 3 << 128 | 2 << 64 | 1
+    >>> _turned(hashes, 1) == 1 << 192 | 4 << 128 | 3 << 64 | 2
+    True
+    """
+    shift = 64 * (turns % 4)
+    return (hashes >> shift | hashes << (256 - shift)) & _PACKED_MASK
+
 
 def _block_to_squares(board: Block) -> list[tuple[tuple[int, int, int],
                                                   tuple[int, int], int]]:
@@ -76,6 +108,42 @@ def generate_board(max_depth: int, size: int) -> Block:
     return board
 
 
+def majority(values: Sequence[Any]) -> Any | None:
+    """Return the value that appears more often in <values> than any other
+    value, or None if there is no such value.
+
+    This is the rule Block.combine uses to choose the colour of the leaf it
+    makes, so other representations of a board share it.
+
+    >>> majority([COLOUR_LIST[0], COLOUR_LIST[0], COLOUR_LIST[1], 7])
+    (1, 128, 181)
+    >>> majority([0, 0, 1, 1]) is None
+    True
+
+    Preconditions:
+    - len(values) > 0
+    """
+    best = max(set(values), key=values.count)
+    count = values.count(best)
+    if any(value != best and values.count(value) == count
+           for value in set(values)):
+        return None
+    return best
+
+
+def to_block(view: Any) -> Block:
+    """Return a new Block tree equivalent to the subtree at <view>.
+
+    <view> is anything with the attributes of a Block that are used to read a
+    board, such as a quadtree.ArrayBlock or a persistent.PersistentBlock.
+    """
+    result = Block(view.position, view.size, view.colour, view.level,
+                   view.max_depth)
+    if view.children:
+        result.children = [to_block(child) for child in view.children]
+    return result
+
+
 class Block:
     """A square Block in the Blocky game, represented as a tree.
 
@@ -101,6 +169,8 @@ class Block:
     - children: The blocks into which this block is subdivided. The children are
                 stored in this order: upper-right child, upper-left child,
                 lower-left child, lower-right child.
+    - parent: The Block this Block is a child of, or None if this Block is
+              the root of its board.
 
     Representation Invariants:
     - self.level <= self.max_depth
@@ -111,16 +181,47 @@ class Block:
         - their level is one greater than that of this Block.
         - their position is determined by the position and size of this Block,
           and their index in this Block's list of children.
+        - their parent is this Block.
         - this Block's colour is None.
     - If this Block has no children:
         - its colour is not None.
+
+    Blocks declare __slots__, so they carry no per-instance __dict__. A deep
+    board holds one Block per node, and dropping the dictionary is most of
+    the per-node memory. What is pending or cached for the children of a
+    Block is kept in its list of children, and all leaves share one empty
+    list, so a leaf holds nothing but its own attributes.
+
+    Rotations and the positions of descendants are applied lazily. rotate and
+    swap only record what has to happen to this Block's children, and the
+    children are put in order and given their positions the next time they
+    are read through <children>, or when the position of one of their
+    descendants is read. A Block held on to while one of its ancestors is
+    swapped or rotated therefore still reports where it is.
+
+    Changing a Block directly, by setting its colour or children or by
+    changing the list returned by <children>, also keeps its board up to
+    date: the Block becomes the parent of its new children, and the change is
+    reported to the board's observers as an action named 'edit', which a
+    Journal can roll back like any other action.
+
+    Private Attributes
+    - _position: The position of this Block, as of the last time the
+                 rotations pending above it were applied.
+    - _colour: The colour of this Block, as returned by <colour>.
+    - _children: The children of this Block, before any pending rotation is
+                 applied, or _NO_CHILDREN if this Block is a leaf that is
+                 not the root of a board with observers.
     """
-    position: tuple[int, int]
+    __slots__ = ('_position', 'size', '_colour', 'level', 'max_depth',
+                 '_children', 'parent')
+    _position: tuple[int, int]
     size: int
-    colour: tuple[int, int, int] | None
     level: int
     max_depth: int
-    children: list[Block]
+    parent: Block | None
+    _colour: tuple[int, int, int] | None
+    _children: _Children
 
     def __init__(self, position: tuple[int, int], size: int,
                  colour: tuple[int, int, int] | None, level: int,
@@ -146,12 +247,13 @@ class Block:
         >>> block.max_depth
         1
         """
-        self.position = position
+        self._position = position
         self.size = size
-        self.colour = colour
+        self._colour = colour
         self.level = level
         self.max_depth = max_depth
-        self.children = []
+        self.parent = None
+        self._children = _NO_CHILDREN
 
     def __str__(self) -> str:
         """Return this Block in a string format.
@@ -199,6 +301,274 @@ class Block:
         else:
             return self.children == other.children
 
+    @property
+    def position(self) -> tuple[int, int]:
+        """The (x, y) coordinates of the upper left corner of this Block.
+
+        >>> board = Block((0, 0), 750, COLOUR_LIST[0], 0, 2)
+        >>> board.smash()
+        True
+        >>> held = board.children[0]
+        >>> held.position
+        (375, 0)
+        >>> board.rotate(ROT_CW)
+        True
+        >>> held.position
+        (375, 375)
+        """
+        self._settle_ancestors()
+        return self._position
+
+    @position.setter
+    def position(self, position: tuple[int, int]) -> None:
+        """Move this Block to <position>, without moving its children.
+        """
+        self._position = position
+
+    @property
+    def colour(self) -> tuple[int, int, int] | None:
+        """The colour of this Block, or None if it has children.
+        """
+        return self._colour
+
+    @colour.setter
+    def colour(self, colour: tuple[int, int, int] | None) -> None:
+        """Set the colour of this Block to <colour>, as an edit.
+        """
+        undo = self._edit_undo()
+        self._colour = colour
+        self._changed('edit', undo)
+
+    @property
+    def children(self) -> list[Block]:
+        """The blocks into which this block is subdivided, in this order:
+        upper-right child, upper-left child, lower-left child, lower-right
+        child.
+
+        >>> board = Block((0, 0), 750, COLOUR_LIST[0], 0, 1)
+        >>> for position in board.children_positions():
+        ...     board.children.append(Block(position, 375, COLOUR_LIST[1],
+        ...                                 1, 1))
+        >>> board.colour = None
+        >>> board.children[2].path()
+        (2,)
+        """
+        children = self._children
+        if children.stale:
+            self._settle_children()
+        elif children is _NO_CHILDREN:
+            return _children_of(self)
+        return children
+
+    @children.setter
+    def children(self, children: list[Block]) -> None:
+        """Make <children> the children of this Block, as an edit.
+        """
+        undo = self._edit_undo()
+        self._set_children(children)
+        self._changed('edit', undo)
+
+    def _set_children(self, children: list[Block]) -> None:
+        """Make <children> the children of this Block, with no rotation
+        pending, without reporting the change.
+        """
+        for child in children:
+            child.parent = self
+        own = self._children
+        if own is _NO_CHILDREN:
+            if children:
+                self._children = _children_of(self, children)
+        else:
+            own.restore(children)
+            own.rotation = 0
+            own.stale = bool(own)
+            own.hashes = None
+            if not own and own.observers is None:
+                self._children = _NO_CHILDREN
+
+    def _edit_undo(self) -> tuple[list[Block], int,
+                                  tuple[int, int, int] | None]:
+        """Return what reverses an edit of this Block made from now on: its
+        children, the rotation pending for them and its colour.
+        """
+        children = self._children
+        return list(children), children.rotation, self._colour
+
+    def _settle_children(self) -> None:
+        """Apply this Block's pending rotation to its children and give them
+        positions consistent with this Block's position.
+
+        The rotation is passed on to the children, which apply it to their own
+        children when those are read.
+        """
+        children = self._children
+        rotation = children.rotation
+        if rotation:
+            children.reorder([(i + rotation) % 4 for i in range(4)])
+        x, y = self._position
+        size = self.child_size()
+        positions = [(x + size, y), (x, y), (x, y + size),
+                     (x + size, y + size)]
+        for child, position in zip(children, positions):
+            child.place(position, rotation)
+        children.rotation = 0
+        children.stale = False
+
+    def _settle_ancestors(self) -> None:
+        """Apply every rotation pending above this Block, so that this
+        Block's children are the ones it has in the current board.
+        """
+        if self.parent is not None:
+            self.parent.settle()
+
+    def settle(self) -> None:
+        """Apply every rotation and move pending for this Block and its
+        ancestors, so that this Block's children are in order and in place.
+
+        Reading a Block does this as needed, so it is only worth calling to
+        choose when the work is done.
+        """
+        if self.parent is not None:
+            self.parent.settle()
+        if self._children.stale:
+            self._settle_children()
+
+    def place(self, position: tuple[int, int], turns: int = 0) -> None:
+        """Move this Block to <position> and turn it clockwise by <turns>
+        quarter turns, taking all its descendents with it.
+
+        This takes constant time, as the descendents are moved as they are
+        read. Unlike the actions, it is not reported to the observers of the
+        board.
+        """
+        self._position = position
+        children = self._children
+        if children:
+            children.stale = True
+            if turns:
+                children.rotation = (children.rotation + turns) % 4
+                if children.hashes is not None:
+                    children.hashes = _turned(children.hashes, turns)
+
+    def add_observer(self, observer: Any) -> None:
+        """Tell <observer> about every action performed on this board from
+        now on.
+
+        After an action is performed on a Block of this board, the Block calls
+        observer.block_changed(block, action, undo), where <action> names the
+        action and <undo> is what Journal needs to reverse it. When a Journal
+        reverses an action, <action> is 'undo' and <undo> is None.
+
+        Preconditions:
+        - self.level == 0
+        """
+        if self._children is _NO_CHILDREN:
+            self._children = _children_of(self)
+        children = self._children
+        if children.observers is None:
+            children.observers = []
+        children.observers.append(observer)
+
+    def remove_observer(self, observer: Any) -> None:
+        """Stop telling <observer> about actions performed on this board.
+
+        Preconditions:
+        - <observer> was added to this Block with add_observer
+        """
+        children = self._children
+        children.observers.remove(observer)
+        if not children.observers:
+            children.observers = None
+            if not children:
+                self._children = _NO_CHILDREN
+
+    def find_observer(self, kind: type) -> Any | None:
+        """Return the observer of this board that is an instance of <kind>,
+        or None if it has none.
+        """
+        for observer in self._children.observers or []:
+            if isinstance(observer, kind):
+                return observer
+        return None
+
+    def path(self) -> tuple[int, ...]:
+        """Return the indexes of the children leading from the root of this
+        Block's board to this Block.
+
+        >>> board = Block((0, 0), 750, COLOUR_LIST[0], 0, 2)
+        >>> board.smash()
+        True
+        >>> board.path()
+        ()
+        >>> board.children[2].path()
+        (2,)
+        """
+        self._settle_ancestors()
+        indexes = []
+        node = self
+        while node.parent is not None:
+            siblings = node.parent.children
+            indexes.append(next(i for i in range(len(siblings))
+                                if siblings[i] is node))
+            node = node.parent
+        return tuple(reversed(indexes))
+
+    def _changed(self, action: str, undo: Any) -> None:
+        """Tell the observers of this Block's board that <action> has been
+        performed on this Block, and that <undo> reverses it.
+
+        The cached hashes of this Block and its ancestors are discarded on the
+        way, except that a rotated Block has already updated its own.
+        """
+        children = self._children
+        if action != 'rotate' and children:
+            children.hashes = None
+        self._pass_on(self, action, undo)
+
+    def block_changed(self, block: Block, action: str, undo: Any) -> None:
+        """Discard the cached hashes of this Block, as <action> has been
+        performed on <block>, one of its descendents, and pass that on
+        towards the observers of the board.
+
+        Each Block observes its children in this way.
+        """
+        self._children.hashes = None
+        self._pass_on(block, action, undo)
+
+    def _pass_on(self, block: Block, action: str, undo: Any) -> None:
+        """Tell the parent of this Block, or the observers of its board if it
+        is the root, that <action> has been performed on <block> and that
+        <undo> reverses it.
+        """
+        if self.parent is not None:
+            self.parent.block_changed(block, action, undo)
+            return
+        observers = self._children.observers
+        if observers:
+            for observer in observers:
+                observer.block_changed(block, action, undo)
+
+    def revert(self, action: str, undo: Any) -> None:
+        """Reverse <action>, which was performed on this Block and reported
+        to the observers with <undo>.
+        """
+        self._settle_ancestors()
+        if action == 'smash':
+            self._set_children([])
+            self._colour = undo
+        elif action in ('combine', 'edit'):
+            children, rotation, self._colour = undo
+            self._set_children(children)
+            if rotation:
+                self._children.rotation = rotation
+        elif action == 'paint':
+            self._colour = undo
+        elif action == 'swap':
+            self._swap_children(undo)
+        elif action == 'rotate':
+            self.place(self._position, undo)
+        self._changed('undo', None)
+
     def child_size(self) -> int:
         """Return the size of this Block's children.
         """
@@ -221,14 +591,11 @@ class Block:
         descendants to have positions consistent with this Block's position.
 
         <position> is the (x, y) coordinates of the upper-left corner of this
-        Block.
+        Block. The descendants are updated lazily, one level at a time, as
+        they are read through <children>.
         """
 
-        self.position = position
-        if self.children:
-            for i in range(4):
-                self.children[i]._update_children_positions(
-                    self.children_positions()[i])
+        self.place(position)
 
     def smashable(self) -> bool:
         """Return True iff this block can be smashed.
@@ -236,9 +603,55 @@ class Block:
         A block can be smashed if it has no children and its level is not at
         max_depth.
         """
-        return self.level != self.max_depth and len(self.children) == 0
+        return self.level != self.max_depth and not self._children
+
+    def can_smash(self) -> bool:
+        """Return True iff smash would succeed on this Block.
+
+        This and the other can_ methods only look at this Block and its
+        children; they never change the board.
+        """
+        return self.level != self.max_depth and not self._children
 
-    def smash(self) -> bool:
+    def can_swap(self) -> bool:
+        """Return True iff swap would succeed on this Block.
+        """
+        return bool(self._children)
+
+    def can_rotate(self) -> bool:
+        """Return True iff rotate would succeed on this Block.
+        """
+        return bool(self._children)
+
+    def can_paint(self, colour: tuple[int, int, int]) -> bool:
+        """Return True iff paint would succeed on this Block with <colour>.
+        """
+        return self.level == self.max_depth and self._colour != colour
+
+    def can_combine(self) -> bool:
+        """Return True iff combine would succeed on this Block.
+
+        >>> block = Block((0, 0), 750, COLOUR_LIST[0], 0, 1)
+        >>> block.can_combine()
+        False
+        >>> block.smash()
+        True
+        >>> for child, colour in zip(block.children, [0, 0, 1, 1]):
+        ...     _ = child.paint(COLOUR_LIST[colour])
+        >>> block.can_combine()
+        False
+        >>> _ = block.children[3].paint(COLOUR_LIST[2])
+        >>> block.can_combine()
+        True
+        """
+        if not self._children \
+                or any(child.colour is None for child in self._children):
+            return False
+        return majority([child.colour for child in self._children]) \
+            is not None
+
+    @hot
+    def smash(self, rng: random.Random | None = None) -> bool:
         """ Return True iff the smash was performed successfully.
         A smash is successful if the block genrates four children blocks and
         has no colour anymore.
@@ -260,6 +673,10 @@ class Block:
         If this Block's level is <max_depth>, do nothing. If this block has
         children, do nothing.
 
+        If <rng> is given, the random numbers are drawn from it instead of
+        from the random module, so a smash made in one thread does not change
+        the random numbers drawn in another.
+
         >>> position = (0, 0)
         >>> size = 750
         >>> level = 0
@@ -280,17 +697,31 @@ class Block:
         >>> b1.max_depth == max_depth
         True
         """
-        if not self.smashable():
+        if not self.can_smash():
             return False
-        self.children = [Block((0, 0), self.child_size(), random.choice(
-            COLOUR_LIST), self.level + 1, self.max_depth) for _ in range(4)]
-        self._update_children_positions(self.position)
-        self.colour = None
-        for child in self.children:
-            if random.random() < math.exp(-0.25 * (self.level + 1)):
-                child.smash()
+        self._settle_ancestors()
+        colour = self._colour
+        self._smash_children(random if rng is None else rng)
+        self._changed('smash', colour)
         return True
 
+    def _smash_children(self, rng: Any) -> None:
+        """Give this leaf four randomly generated children, smashing each of
+        them in turn with the probability described in smash.
+
+        The random numbers are drawn from <rng>, which is a random.Random or
+        the random module itself.
+        """
+        children = [Block((0, 0), self.child_size(), rng.choice(COLOUR_LIST),
+                          self.level + 1, self.max_depth) for _ in range(4)]
+        for child in children:
+            if rng.random() < math.exp(-0.25 * (self.level + 1)) \
+                    and child.smashable():
+                child.smash(rng)
+        self._set_children(children)
+        self._colour = None
+
+    @hot
     def swap(self, direction: int) -> bool:
         """Swap the child Blocks of this Block.
 
@@ -298,25 +729,30 @@ class Block:
         SWAP_VERT, swap vertically.
         If <direction> is SWAP_HORZ, swap horizontally.
 
-        Return True iff the swap was performed.
+        Return True iff the swap was performed. This takes constant time, as
+        the descendants of the swapped children are moved lazily.
 
         Precondition:
         - <direction> is either (SWAP_VERT, SWAP_HORZ)
         """
-        if not self.children:
+        if not self.can_swap():
             return False
+        self._settle_ancestors()
+        self._swap_children(direction)
+        self._changed('swap', direction)
+        return True
+
+    def _swap_children(self, direction: int) -> None:
+        """Swap the children of this Block in <direction>.
+        """
         if direction == SWAP_HORZ:
-            self.children[0], self.children[1], self.children[2], \
-                self.children[3] = self.children[1], self.children[0], \
-                self.children[3], self.children[2]
+            self.children.reorder((1, 0, 3, 2))
         elif direction == SWAP_VERT:
-            self.children[0], self.children[1], self.children[2], \
-                self.children[3] = self.children[3], self.children[2], \
-                self.children[1], self.children[0]
+            self.children.reorder((3, 2, 1, 0))
 
-        self._update_children_positions(self.position)
-        return True
+        self._update_children_positions(self._position)
 
+    @hot
     def rotate(self, direction: int) -> bool:
         """Rotate this Block and all its descendents.
 
@@ -324,26 +760,23 @@ class Block:
         If <direction> is ROT_CW, rotate clockwise.
         If <direction> is ROT_CCW, rotate counter-clockwise.
 
-        Return True iff the rotation was performed.
+        Return True iff the rotation was performed. This takes constant time:
+        the rotation is recorded here and applied to each level of
+        descendents as it is read.
 
         Preconditions:
         - direction in (ROT_CW, ROT_CCW)
         """
 
-        if not self.children:
+        if not self.can_rotate():
             return False
 
-        if direction == ROT_CW:
-            self.children = [self.children[1], self.children[2],
-                             self.children[3], self.children[0]]
-        elif direction == ROT_CCW:
-            self.children = [self.children[3], self.children[0],
-                             self.children[1], self.children[2]]
-        self._update_children_positions(self.position)
-        for child in self.children:
-            child.rotate(direction)
+        if direction in (ROT_CW, ROT_CCW):
+            self.place(self._position, direction)
+            self._changed('rotate', 4 - direction)
         return True
 
+    @hot
     def paint(self, colour: tuple[int, int, int]) -> bool:
         """Change this Block's colour iff it is a leaf at a level of max_depth
         and its colour is different from <colour>.
@@ -351,11 +784,14 @@ class Block:
         Return True iff this Block's colour was changed.
         """
 
-        if self.level == self.max_depth and self.colour != colour:
-            self.colour = colour
+        if self.can_paint(colour):
+            old_colour = self._colour
+            self._colour = colour
+            self._changed('paint', old_colour)
             return True
         return False
 
+    @hot
     def combine(self) -> bool:
         """Turn this Block into a leaf based on the majority colour of its
         children. Each child block must also be a leaf.
@@ -370,24 +806,18 @@ class Block:
 
         Return True iff this Block was turned into a leaf node.
         """
-        if not self.children \
-                or any(child.colour is None for child in self.children):
+        if not self.can_combine():
             return False
 
-        table = {}
-        all_colours = [child.colour for child in self.children]
-        for colour in all_colours:
-            if colour in table:
-                table[colour] += 1
-            else:
-                table[colour] = 1
-        if tuple([table[item] for item in table]) in {(2, 2), (1, 1, 1, 1)}:
-            return False
-        colour = max(set(all_colours), key=all_colours.count)
-        self.children = []
-        self.colour = colour
+        self._settle_ancestors()
+        colour = majority([child.colour for child in self.children])
+        undo = self._edit_undo()
+        self._set_children([])
+        self._colour = colour
+        self._changed('combine', undo)
         return True
 
+    @hot
     def create_copy(self) -> Block:
         """Return a new Block that is a deep copy of this Block.
 
@@ -400,12 +830,355 @@ class Block:
         >>> block == copy
         True
         """
-        result = Block(self.position, self.size, self.colour,
-                       self.level, self.max_depth)
-        for item in self.children:
-            result.children.append(item.create_copy())
+        return copy.deepcopy(self)
+
+    def __deepcopy__(self, memo: dict[int, Any]) -> Block:
+        """Return a new Block that is a deep copy of this Block, as the root
+        of a board with no observers.
+
+        The copy has the same rotations pending as this Block's descendents,
+        and the same cached hashes.
+        """
+        self._settle_ancestors()
+        result = Block(self._position, self.size, self._colour, self.level,
+                       self.max_depth)
+        memo[id(self)] = result
+        originals = [(self, result)]
+        while originals:
+            block, copied = originals.pop()
+            children = block._children
+            if children:
+                copies = [Block(child._position, child.size, child._colour,
+                                child.level, child.max_depth)
+                          for child in children]
+                copied._set_children(copies)
+                pending = copied._children
+                pending.rotation = children.rotation
+                pending.stale = children.stale
+                pending.hashes = children.hashes
+                originals.extend(zip(children, copies))
         return result
 
+    def zobrist_hash(self) -> int:
+        """Return a 64-bit hash of this Block and all its descendents.
+
+        Blocks that are equal apart from their position have the same hash.
+        Hashes are cached in every Block with children and kept up to date by
+        the actions: after an action, only the hashes of the changed Block and
+        its ancestors are recomputed, and a rotation reuses the hashes it
+        already has. Different boards have the same hash only by a very
+        unlikely coincidence.
+
+        >>> b1 = generate_board(3, 750)
+        >>> b2 = b1.create_copy()
+        >>> b1.zobrist_hash() == b2.zobrist_hash()
+        True
+        >>> b1.rotate(ROT_CW)
+        True
+        >>> b2.rotate(ROT_CW)
+        True
+        >>> b1.zobrist_hash() == b2.zobrist_hash()
+        True
+        """
+        hashes = self._children.hashes
+        if hashes is not None:
+            return hashes & _HASH_MASK
+        return self.orientation_hashes()[0]
+
+    def is_symmetric(self, turns: int) -> bool:
+        """Return True iff turning this Block clockwise by <turns> quarter
+        turns leaves it unchanged, apart from a very unlikely coincidence of
+        hashes.
+
+        >>> block = Block((0, 0), 750, COLOUR_LIST[0], 0, 1)
+        >>> block.smash()
+        True
+        >>> for child in block.children:
+        ...     _ = child.paint(COLOUR_LIST[0])
+        >>> block.is_symmetric(ROT_CW)
+        True
+        >>> _ = block.children[0].paint(COLOUR_LIST[1])
+        >>> block.is_symmetric(ROT_CW), block.is_symmetric(2)
+        (False, False)
+        """
+        if not self._children:
+            return True
+        if self._children.hashes is None:
+            self.orientation_hashes()
+        hashes = self._children.hashes
+        return hashes & _HASH_MASK == hashes >> 64 * (turns % 4) & _HASH_MASK
+
+    def orientation_hashes(self) -> tuple[int, int, int, int]:
+        """Return the zobrist_hash of this Block after 0, 1, 2 and 3 more
+        ROT_CW turns.
+
+        >>> block = generate_board(3, 750)
+        >>> hashes = block.orientation_hashes()
+        >>> block.rotate(ROT_CW)
+        True
+        >>> block.zobrist_hash() == hashes[1]
+        True
+        """
+        row = self.level % len(_ZOBRIST_KEYS)
+        if not self._children:
+            leaves = _LEAF_HASHES[row]
+            leaf = leaves.get(self._colour)
+            if leaf is None:
+                leaf = (hash(self._colour) & _HASH_MASK) \
+                    * _ZOBRIST_KEYS[row][5] & _HASH_MASK
+                leaves[self._colour] = leaf
+            return leaf, leaf, leaf, leaf
+        packed = self._children.hashes
+        if packed is not None:
+            return (packed & _HASH_MASK, packed >> 64 & _HASH_MASK,
+                    packed >> 128 & _HASH_MASK, packed >> 192)
+        keys = _ZOBRIST_KEYS[row]
+        child_hashes = [child.orientation_hashes()
+                        for child in self.children]
+        hashes = []
+        for turns in range(4):
+            result = keys[4]
+            for i in range(4):
+                child = child_hashes[(i + turns) % 4][turns]
+                result ^= child * keys[i] & _HASH_MASK
+            hashes.append(result)
+        self._children.hashes = hashes[0] | hashes[1] << 64 \
+            | hashes[2] << 128 | hashes[3] << 192
+        return tuple(hashes)
+
+
+class _Children(list):
+    """The list of children of a Block, with what is pending or cached for
+    them.
+
+    Changing the list directly, for example with append, sets the children
+    of its Block, which makes the Block their parent and reports the change
+    to the Block's board as an edit.
+
+    Attributes
+    - owner: The Block these are the children of, or None for _NO_CHILDREN.
+    - rotation: The rotation still to be applied to these children and all
+                their descendents, as a number of ROT_CW turns.
+    - stale: True iff the order or positions of these children have not
+             been brought up to date.
+    - hashes: The hash of <owner> after 0, 1, 2 and 3 more ROT_CW turns,
+              packed into one int, or None if it has to be recomputed.
+              Leaves never keep their hashes, which are cheap to compute.
+    - observers: The objects told about every action performed on the board
+                 of <owner>, if <owner> is its root and has any, and None
+                 otherwise.
+    """
+    __slots__ = ('owner', 'rotation', 'stale', 'hashes', 'observers')
+    owner: Block | None
+    rotation: int
+    stale: bool
+    hashes: int | None
+    observers: list[Any] | None
+
+    def reorder(self, order: Iterable[int]) -> None:
+        """Put the child at each index in <order> at the next index of this
+        list, without reporting the change.
+        """
+        list.__setitem__(self, slice(None), [self[i] for i in order])
+
+    def restore(self, children: Iterable[Block]) -> None:
+        """Make this list hold <children>, without reporting the change.
+        """
+        list.__setitem__(self, slice(None), children)
+
+    def __reduce__(self) -> Any:
+        """Return how to rebuild this list when it is copied or pickled:
+        whole, so that it is never filled in one child at a time, and without
+        the observers of the board, which a copy does not have.
+        """
+        if self is _NO_CHILDREN:
+            return '_NO_CHILDREN'
+        return _children_of, (self.owner, list(self)), \
+            (None, {'rotation': self.rotation, 'stale': self.stale,
+                    'hashes': self.hashes})
+
+    def _edit(self, children: list[Block]) -> None:
+        """Make <children> the children of the owner of this list, as an
+        edit, and what this list holds.
+        """
+        self.owner.children = children
+        self.restore(children)
+
+    def __setitem__(self, index: Any, value: Any) -> None:
+        """Set the item or slice at <index> to <value>.
+        """
+        children = list(self)
+        children[index] = value
+        self._edit(children)
+
+    def __delitem__(self, index: Any) -> None:
+        """Remove the item or slice at <index>.
+        """
+        children = list(self)
+        del children[index]
+        self._edit(children)
+
+    def __iadd__(self, other: Iterable[Block]) -> _Children:
+        """Add the children in <other> to the end of this list.
+        """
+        self._edit(list(self) + list(other))
+        return self
+
+    def __imul__(self, times: int) -> _Children:
+        """Repeat the children in this list <times> times.
+        """
+        self._edit(list(self) * times)
+        return self
+
+    def append(self, child: Block) -> None:
+        """Add <child> to the end of this list.
+        """
+        self._edit(list(self) + [child])
+
+    def extend(self, children: Iterable[Block]) -> None:
+        """Add <children> to the end of this list.
+        """
+        self._edit(list(self) + list(children))
+
+    def insert(self, index: int, child: Block) -> None:
+        """Insert <child> before <index>.
+        """
+        children = list(self)
+        children.insert(index, child)
+        self._edit(children)
+
+    def pop(self, index: int = -1) -> Block:
+        """Remove and return the child at <index>.
+        """
+        children = list(self)
+        child = children.pop(index)
+        self._edit(children)
+        return child
+
+    def remove(self, child: Block) -> None:
+        """Remove the first child equal to <child>.
+        """
+        children = list(self)
+        children.remove(child)
+        self._edit(children)
+
+    def clear(self) -> None:
+        """Remove every child.
+        """
+        self._edit([])
+
+    def reverse(self) -> None:
+        """Reverse the order of the children.
+        """
+        self._edit(list(reversed(self)))
+
+    def sort(self, *args: Any, **kwargs: Any) -> None:
+        """Sort the children, as list.sort does.
+        """
+        children = list(self)
+        children.sort(*args, **kwargs)
+        self._edit(children)
+
+
+def _children_of(owner: Block | None,
+                 children: Iterable[Block] = ()) -> _Children:
+    """Return a new list of the children of <owner>, holding <children>,
+    with nothing pending or cached.
+    """
+    result = _Children(children)
+    result.owner = owner
+    result.rotation = 0
+    result.stale = bool(result)
+    result.hashes = None
+    result.observers = None
+    return result
+
+
+# The list of children shared by every leaf, which is never changed.
+_NO_CHILDREN = _children_of(None)
+
+
+class Journal:
+    """A record of the actions performed on a board, which can be rolled
+    back exactly.
+
+    While a Journal is open on a board, it records every action performed on
+    any Block of that board. Rolling back undoes the recorded actions in the
+    reverse order, leaving every Block object where it was. This lets a board
+    be used to try out moves without being copied.
+
+    === Private Attributes ===
+    _board: The board this Journal records actions on.
+    _entries: The Block each recorded action was performed on, the name of
+              the action, and what reverses it, in the order performed.
+    _rolling_back: True iff this Journal is in the middle of a rollback.
+    """
+    _board: Block
+    _entries: list[tuple[Block, str, Any]]
+    _rolling_back: bool
+
+    def __init__(self, board: Block) -> None:
+        """Start recording the actions performed on <board>.
+
+        >>> board = Block((0, 0), 750, COLOUR_LIST[0], 0, 1)
+        >>> copy = board.create_copy()
+        >>> journal = Journal(board)
+        >>> board.smash()
+        True
+        >>> board.rotate(ROT_CW)
+        True
+        >>> board.children[0].colour = COLOUR_LIST[3]
+        >>> del board.children[1:]
+        >>> len(journal)
+        4
+        >>> journal.rollback()
+        >>> journal.close()
+        >>> board == copy
+        True
+
+        Preconditions:
+        - board.level == 0
+        """
+        self._board = board
+        self._entries = []
+        self._rolling_back = False
+        board.add_observer(self)
+
+    def __len__(self) -> int:
+        """Return the number of actions recorded and not rolled back.
+        """
+        return len(self._entries)
+
+    def block_changed(self, block: Block, action: str, undo: Any) -> None:
+        """Record that <action> was performed on <block>, and that <undo>
+        reverses it.
+        """
+        if not self._rolling_back:
+            self._entries.append((block, action, undo))
+
+    @hot
+    def rollback(self, mark: int = 0) -> None:
+        """Undo recorded actions, latest first, until only <mark> of them
+        remain.
+
+        Passing len(self) as <mark> before a series of actions and again to
+        rollback afterwards undoes just that series.
+        """
+        self._rolling_back = True
+        try:
+            while len(self._entries) > mark:
+                block, action, undo = self._entries.pop()
+                block.revert(action, undo)
+        finally:
+            self._rolling_back = False
+
+    def close(self) -> None:
+        """Stop recording actions. The recorded actions can no longer be
+        rolled back.
+        """
+        self._board.remove_observer(self)
+        self._entries = []
+
 
 if __name__ == '__main__':
     import python_ta
@@ -413,7 +1186,7 @@ if __name__ == '__main__':
     python_ta.check_all(config={
         'allowed-import-modules': [
             'doctest', 'python_ta', 'random', 'typing', '__future__', 'math',
-            'settings'
+            'copy', 'instrument', 'settings'
         ],
         'max-attributes': 15,
         'max-args': 6
@@ -0,0 +1,332 @@
+"""CSC148 Assignment 2
+
+CSC148 Winter 2024
+Department of Computer Science,
+University of Toronto
+
+This code is provided solely for the personal and private use of
+students taking the CSC148 course at the University of Toronto.
+Copying for purposes other than this use is expressly prohibited.
+All forms of distribution of this code, whether as given or with
+any changes, are expressly prohibited.
+
+Authors: Diane Horton, David Liu, Mario Badr, Sophia Huynh, Misha Schwartz,
+Jaisie Sin, and Joonho Kim
+
+All of the files in this directory and all subdirectories are:
+Copyright (c) Diane Horton, David Liu, Mario Badr, Sophia Huynh,
+Misha Schwartz, Jaisie Sin, and Joonho Kim
+
+Module Description:
+
+This file contains a compact binary encoding of boards, and a corpus file
+format that stores many encoded boards and reads any one of them back
+without reading the others.
+
+An encoded board starts with a header holding its max_depth, as one byte,
+and its size, as four little-endian bytes. A bitstream follows, which
+visits the blocks of the board in preorder, each block before its children
+and the children in the order of Block.children. Each block above max_depth
+is given one bit: 1 if it has children and 0 if not. Each block without
+children is then given two bits: the index of its colour in COLOUR_LIST. The
+bits are packed into bytes most significant bit first, and the last byte is
+padded with 0 bits.
+
+A corpus file starts with a header holding the format's magic bytes, the
+number of boards and the position of the offset table. The encoded boards
+follow, one after the other, and then the offset table, which holds the
+position of each board and of the end of the last one, as little-endian
+8-byte numbers. A BoardCorpus reads the file through mmap, so opening one
+reads nothing but the header, however many boards it holds.
+"""
+from __future__ import annotations
+from array import array
+from typing import BinaryIO, Iterable
+import mmap
+import struct
+import sys
+
+from block import Block
+from persistent import Node, PersistentBlock, PersistentBoard
+from settings import COLOUR_LIST
+
+# The header of an encoded board: its max_depth and size.
+_BOARD_HEADER = struct.Struct('<BI')
+
+# The header of a corpus file: the magic bytes, the number of boards and the
+# position of the offset table.
+_CORPUS_HEADER = struct.Struct('<8sQQ')
+_CORPUS_MAGIC = b'BLOCKY\x00\x01'
+
+# An entry in the offset table of a corpus file.
+_OFFSET = struct.Struct('<Q')
+
+# The two bits of each colour: the index of the colour in COLOUR_LIST.
+_COLOUR_BITS = {colour: format(i, '02b')
+                for i, colour in enumerate(COLOUR_LIST)}
+
+
+def encode(board: Block) -> bytes:
+    """Return the encoding of the board rooted at <board>.
+
+    A board of max_depth d with n blocks takes at most 5 + (3n + 7) // 8
+    bytes.
+
+    Preconditions:
+    - board.level == 0
+    - len(COLOUR_LIST) <= 4
+
+    >>> board = Block((0, 0), 750, COLOUR_LIST[2], 0, 1)
+    >>> encode(board).hex()
+    '01ee02000040'
+    >>> board.smash()
+    True
+    >>> len(encode(board))
+    7
+    """
+    bits = []
+    _encode_block(board, bits)
+    return _pack(board.max_depth, board.size, ''.join(bits))
+
+
+def _encode_block(block: Block | PersistentBlock, bits: list[str]) -> None:
+    """Append the bits of the subtree rooted at <block> to <bits>.
+    """
+    if block.children:
+        bits.append('1')
+        for child in block.children:
+            _encode_block(child, bits)
+    elif block.level < block.max_depth:
+        bits.append('0' + _COLOUR_BITS[block.colour])
+    else:
+        bits.append(_COLOUR_BITS[block.colour])
+
+
+def encode_persistent(board: PersistentBoard) -> bytes:
+    """Return the encoding of <board>, which is the same as the encoding of
+    board.to_block().
+
+    >>> from block import generate_board
+    >>> block = generate_board(4, 750)
+    >>> encode_persistent(PersistentBoard.from_block(block)) == encode(block)
+    True
+    """
+    bits = []
+    _encode_block(board.block(), bits)
+    return _pack(board.max_depth, board.size, ''.join(bits))
+
+
+def _pack(max_depth: int, size: int, bits: str) -> bytes:
+    """Return the header for <max_depth> and <size>, followed by <bits>
+    packed into bytes.
+    """
+    length = (len(bits) + 7) // 8
+    bits += '0' * (8 * length - len(bits))
+    return _BOARD_HEADER.pack(max_depth, size) \
+        + int(bits, 2).to_bytes(length, 'big')
+
+
+def decode_persistent(data: bytes) -> PersistentBoard:
+    """Return the PersistentBoard encoded in <data>.
+
+    This builds the board's nodes directly, which is much faster than
+    building a tree of Blocks.
+
+    Raise a ValueError if <data> does not hold a whole encoded board.
+    """
+    if len(data) < _BOARD_HEADER.size:
+        raise ValueError('data is too short to hold a board')
+    max_depth, size = _BOARD_HEADER.unpack_from(data)
+    body = bytes(data[_BOARD_HEADER.size:])
+    bits = format(int.from_bytes(body, 'big'), f'0{8 * len(body)}b')
+    try:
+        root, _ = _decode_node(bits, 0, 0, max_depth)
+    except IndexError:
+        raise ValueError('data ends before the board does') from None
+    return PersistentBoard(root, max_depth, size)
+
+
+def _decode_node(bits: str, start: int, level: int,
+                 max_depth: int) -> tuple[Node, int]:
+    """Return the node at <level> whose bits begin at index <start> of
+    <bits>, and the index just past its bits.
+    """
+    if level < max_depth:
+        split = bits[start]
+        start += 1
+        if split == '1':
+            children = []
+            for _ in range(4):
+                child, start = _decode_node(bits, start, level + 1,
+                                            max_depth)
+                children.append(child)
+            return (0,) + tuple(children), start
+    if start + 2 > len(bits):
+        raise IndexError
+    return int(bits[start:start + 2], 2), start + 2
+
+
+def decode(data: bytes) -> Block:
+    """Return a new Block tree for the board encoded in <data>.
+
+    Raise a ValueError if <data> does not hold a whole encoded board.
+
+    >>> from block import generate_board
+    >>> board = generate_board(5, 750)
+    >>> decode(encode(board)) == board
+    True
+    """
+    return decode_persistent(data).to_block()
+
+
+def write_corpus(path: str, boards: Iterable[Block | PersistentBoard]) -> int:
+    """Write the boards in <boards> to a new corpus file at <path>, replacing
+    any file there, and return the number of boards written.
+
+    <boards> is read once, in order, and only one board is held in memory at
+    a time, so it may be a generator of any number of boards. Only the
+    offset table, at 8 bytes a board, is built up in memory.
+    """
+    offsets = array('Q')
+    with open(path, 'wb') as file:
+        file.write(_CORPUS_HEADER.pack(_CORPUS_MAGIC, 0, 0))
+        position = _CORPUS_HEADER.size
+        for board in boards:
+            if isinstance(board, PersistentBoard):
+                data = encode_persistent(board)
+            else:
+                data = encode(board)
+            offsets.append(position)
+            file.write(data)
+            position += len(data)
+        offsets.append(position)
+        if sys.byteorder == 'big':
+            offsets.byteswap()
+        file.write(offsets.tobytes())
+        file.seek(0)
+        file.write(_CORPUS_HEADER.pack(_CORPUS_MAGIC, len(offsets) - 1,
+                                       position))
+    return len(offsets) - 1
+
+
+class BoardCorpus:
+    """The boards in a corpus file, read through mmap.
+
+    Boards are decoded only when they are asked for, by their index in the
+    file, so a corpus of any size opens in constant time and memory.
+
+    Use a BoardCorpus in a with statement, or close it when it is no longer
+    needed.
+
+    Private Instance Attributes:
+    - _file: The corpus file.
+    - _map: The contents of <_file>, mapped into memory.
+    - _count: The number of boards in the corpus.
+    - _table: The position of the offset table in <_file>.
+
+    >>> import os, tempfile
+    >>> from block import generate_board
+    >>> path = os.path.join(tempfile.mkdtemp(), 'boards.bin')
+    >>> boards = [generate_board(depth, 750) for depth in range(5)]
+    >>> write_corpus(path, boards)
+    5
+    >>> with BoardCorpus(path) as corpus:
+    ...     len(corpus), corpus[3] == boards[3], corpus[-1] == boards[4]
+    (5, True, True)
+    """
+    _file: BinaryIO
+    _map: mmap.mmap
+    _count: int
+    _table: int
+
+    def __init__(self, path: str) -> None:
+        """Open the corpus file at <path>.
+
+        Raise a ValueError if the file is not a corpus file, or if it is too
+        short to hold the offset table its header describes.
+        """
+        self._file = open(path, 'rb')
+        try:
+            self._map = mmap.mmap(self._file.fileno(), 0,
+                                  access=mmap.ACCESS_READ)
+        except ValueError:
+            self._file.close()
+            raise ValueError(f'{path} is not a corpus file') from None
+        if len(self._map) < _CORPUS_HEADER.size:
+            self.close()
+            raise ValueError(f'{path} is not a corpus file')
+        magic, self._count, self._table = \
+            _CORPUS_HEADER.unpack_from(self._map)
+        if magic != _CORPUS_MAGIC:
+            self.close()
+            raise ValueError(f'{path} is not a corpus file')
+        if self._table < _CORPUS_HEADER.size or self._table \
+                + (self._count + 1) * _OFFSET.size > len(self._map):
+            self.close()
+            raise ValueError(f'{path} is truncated')
+
+    def __len__(self) -> int:
+        """Return the number of boards in this corpus.
+        """
+        return self._count
+
+    def __getitem__(self, index: int) -> Block:
+        """Return a new Block tree for the board at <index> in this corpus.
+
+        Raise an IndexError if there is no board at <index>.
+        """
+        with self.encoded(index) as data:
+            return decode(data)
+
+    def persistent(self, index: int) -> PersistentBoard:
+        """Return the board at <index> in this corpus as a PersistentBoard.
+
+        Raise an IndexError if there is no board at <index>.
+        """
+        with self.encoded(index) as data:
+            return decode_persistent(data)
+
+    def encoded(self, index: int) -> memoryview:
+        """Return the encoding of the board at <index> in this corpus, as a
+        view of the mapped file.
+
+        Raise an IndexError if there is no board at <index>.
+        """
+        if index < 0:
+            index += self._count
+        if not 0 <= index < self._count:
+            raise IndexError('corpus index out of range')
+        entry = self._table + index * _OFFSET.size
+        start, = _OFFSET.unpack_from(self._map, entry)
+        end, = _OFFSET.unpack_from(self._map, entry + _OFFSET.size)
+        return memoryview(self._map)[start:end]
+
+    def close(self) -> None:
+        """Close this corpus's file.
+
+        Views returned by encoded must be released first.
+        """
+        self._map.close()
+        self._file.close()
+
+    def __enter__(self) -> BoardCorpus:
+        return self
+
+    def __exit__(self, *_: object) -> None:
+        self.close()
+
+
+if __name__ == '__main__':
+    import python_ta
+
+    python_ta.check_all(config={
+        'allowed-import-modules': [
+            'doctest', 'python_ta', 'typing', '__future__', 'array', 'mmap',
+            'struct', 'sys', 'block', 'persistent', 'settings'
+        ],
+        'disable': ['R1732']
+    })
+
+    import doctest
+
+    doctest.testmod()
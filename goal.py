@@ -22,10 +22,19 @@ Module Description:
 This file contains the hierarchy of Goal classes and related helper functions.
 """
 from __future__ import annotations
+from collections import OrderedDict
+from threading import Lock
+from typing import Any
 import random
 from block import Block
+from instrument import hot
+from persistent import PersistentBlock
+from quadtree import ArrayBlock
 from settings import colour_name, COLOUR_LIST
 
+# The most goal scores SCORE_TABLE keeps.
+SCORE_TABLE_CAPACITY = 1 << 16
+
 
 def generate_goals(num_goals: int) -> list[Goal]:
     """Return a randomly generated list of goals with length <num_goals>.
@@ -42,6 +51,7 @@ def generate_goals(num_goals: int) -> list[Goal]:
     return [goal_type(goal) for goal in goals]
 
 
+@hot
 def flatten(block: Block) -> list[list[tuple[int, int, int]]]:
     """Return a two-dimensional list representing <block> as rows and columns of
     unit cells.
@@ -55,27 +65,985 @@ def flatten(block: Block) -> list[list[tuple[int, int, int]]]:
     of the block at the cell location[i][j].
 
     L[0][0] represents the unit cell in the upper left corner of the Block.
+
+    The grid of a whole board is cached with the board and kept up to date:
+    each action marks the cells of the block it changed, and only those cells
+    are repainted by the next call. The grid returned is a new copy of that
+    cache, so it can be changed freely and does not change with the board.
+
+    >>> board = Block((0, 0), 750, COLOUR_LIST[0], 0, 1)
+    >>> before = flatten(board)
+    >>> board.smash()
+    True
+    >>> before == flatten(board), before is flatten(board)
+    (False, False)
+    """
+    return [list(column) for column in _ColourGrid.of(block)]
+
+
+@hot
+def flatten_palette(block: Block) -> list[bytearray]:
+    """Return <block> as columns of unit cells, like flatten, but with each
+    cell given as the index of its colour in PALETTE instead of as a colour.
+
+    Return a list of bytearrays L, where L[i][j] is the index in PALETTE of
+    the colour of the unit cell at column i and row j. Each leaf is filled in
+    with one slice assignment per column, and the columns support fast
+    searching and counting.
+
+    The grid of a whole board is cached and kept up to date in the same way as
+    the grid returned by flatten, and a new copy of it is returned.
+
+    >>> board = Block((0, 0), 750, COLOUR_LIST[2], 0, 1)
+    >>> flatten_palette(board) == [bytearray([2, 2]), bytearray([2, 2])]
+    True
+    """
+    return [bytearray(column) for column in _PaletteGrid.of(block)]
+
+
+@hot
+def flatten_bits(block: Block) -> BitBoard:
+    """Return <block> as a BitBoard, with one bit-plane for each colour.
+
+    The cell at column i and row j is bit i * n + j of the plane of its
+    colour, where n is 2^{max_depth - block.level}, and planes are indexed
+    in the same way as PALETTE.
+
+    The BitBoard of a whole board is cached and kept up to date in the same
+    way as the grid returned by flatten, and a new copy of it is returned.
+
+    >>> board = Block((0, 0), 750, COLOUR_LIST[2], 0, 1)
+    >>> flatten_bits(board).plane(2) == 0b1111
+    True
+    """
+    return _BitGrid.of(block).copy()
+
+
+# The colours a palette grid can hold: those in COLOUR_LIST, in order,
+# followed by any other colour as it is first met.
+PALETTE = list(COLOUR_LIST)
+
+
+def palette_index(colour: tuple[int, int, int]) -> int:
+    """Return the index of <colour> in PALETTE, adding it if it is not there.
+
+    Preconditions:
+    - fewer than 256 different colours are used
+    """
+    if colour not in PALETTE:
+        PALETTE.append(colour)
+    return PALETTE.index(colour)
+
+
+# The offsets, in units of half the parent's width, of the upper left corner
+# of each child of a block, in the order of Block.children.
+_CHILD_OFFSETS = ((1, 0), (0, 0), (0, 1), (1, 1))
+
+
+def _cell_region(block: Block) -> tuple[int, int, int]:
+    """Return the (x, y, width) of the square of unit cells covered by
+    <block>, within the flattened grid of its board.
+    """
+    width = 2 ** (block.max_depth - block.level)
+    x = y = 0
+    half = 2 ** block.max_depth
+    for index in block.path():
+        half //= 2
+        dx, dy = _CHILD_OFFSETS[index]
+        x += dx * half
+        y += dy * half
+    return x, y, width
+
+
+class _FlatGrid:
+    """The flattened grid of a board, kept up to date as the board changes.
+
+    This is an abstract class: subclasses decide how a cell is stored.
+
+    A _FlatGrid observes its board (see Block.add_observer). Each action on
+    the board marks the square of cells covered by the block it changed, and
+    refresh repaints only the marked squares.
+
+    Instance Attributes:
+    - board: The board this grid is the flattened form of.
+    - grid: The flattened board, as a list of columns.
+
+    Private Instance Attributes:
+    - _dirty: The (x, y, width) of each square of cells that may be out of
+              date, or None if the whole grid has to be repainted.
+    """
+    board: Block
+    grid: list
+    _dirty: list[tuple[int, int, int]] | None
+
+    def __init__(self, board: Block) -> None:
+        """Start keeping the flattened grid of <board>.
+
+        Preconditions:
+        - board.level == 0
+        """
+        self.board = board
+        self.grid = self._blank(2 ** board.max_depth)
+        self._dirty = None
+        board.add_observer(self)
+
+    @classmethod
+    def of(cls, block: Block) -> list:
+        """Return the up-to-date grid of <block>.
+
+        The grid of a whole board comes from the grid kept with the board,
+        which is created the first time it is needed. The grid of any other
+        block, or of a read-only view of a board that cannot be observed, is
+        built from scratch.
+        """
+        if block.level != 0 or not isinstance(block, Block):
+            grid = cls._blank(2 ** (block.max_depth - block.level))
+            cls._fill(grid, block, (0, 0, len(grid)), None)
+            return grid
+        cache = block.find_observer(cls)
+        if cache is None:
+            cache = cls(block)
+        return cache.refresh()
+
+    @staticmethod
+    def _blank(grid_size: int) -> list:
+        """Return a new grid of <grid_size> by <grid_size> cells.
+        """
+        raise NotImplementedError
+
+    @staticmethod
+    def _column(block: Block, length: int) -> list | bytes:
+        """Return <length> cells of the colour of the leaf <block>.
+        """
+        raise NotImplementedError
+
+    @classmethod
+    def _fill(cls, grid: list, block: Block, square: tuple[int, int, int],
+              region: tuple[int, int, int] | None) -> None:
+        """Set the cells of <grid> covered by <block> to the colour of the
+        leaf covering them.
+
+        <square> is the (x, y, width) of the cells <block> covers: the width
+        by width cells whose upper left cell is column x, row y. If <region>
+        is not None, it is the (x, y, width) of another square of cells, and
+        only the cells inside that square are set.
+        """
+        x, y, width = square
+        if region is not None:
+            region_x, region_y, region_width = region
+            left, top = max(x, region_x), max(y, region_y)
+            right = min(x + width, region_x + region_width)
+            bottom = min(y + width, region_y + region_width)
+            if left >= right or top >= bottom:
+                return
+        else:
+            left, top, right, bottom = x, y, x + width, y + width
+        if not block.children:
+            column = cls._column(block, bottom - top)
+            for i in range(left, right):
+                grid[i][top:bottom] = column
+            return
+        half = width // 2
+        for child, (dx, dy) in zip(block.children, _CHILD_OFFSETS):
+            cls._fill(grid, child, (x + dx * half, y + dy * half, half),
+                      region)
+
+    def block_changed(self, block: Block, action: str, undo: Any) -> None:
+        """Mark the cells covered by <block> as out of date.
+        """
+        if self._dirty is None:
+            return
+        if len(self._dirty) >= len(self.grid):
+            # Repainting everything is as cheap as working through a long
+            # list of squares.
+            self._dirty = None
+        else:
+            self._dirty.append(_cell_region(block))
+
+    def refresh(self) -> list:
+        """Repaint the cells that are out of date, and return the grid.
+        """
+        if self._dirty is None:
+            self._fill(self.grid, self.board, (0, 0, len(self.grid)), None)
+        else:
+            for region in self._dirty:
+                self._fill(self.grid, self.board, (0, 0, len(self.grid)),
+                           region)
+        self._dirty = []
+        return self.grid
+
+
+class _ColourGrid(_FlatGrid):
+    """A flattened grid whose cells are colours, as returned by flatten.
+    """
+
+    @staticmethod
+    def _blank(grid_size: int) -> list[list[tuple[int, int, int]]]:
+        return [[(0, 0, 0)] * grid_size for _ in range(grid_size)]
+
+    @staticmethod
+    def _column(block: Block, length: int) -> list[tuple[int, int, int]]:
+        return [block.colour] * length
+
+
+class _PaletteGrid(_FlatGrid):
+    """A flattened grid whose cells are indexes into PALETTE, as returned by
+    flatten_palette.
+    """
+
+    @staticmethod
+    def _blank(grid_size: int) -> list[bytearray]:
+        return [bytearray(grid_size) for _ in range(grid_size)]
+
+    @staticmethod
+    def _column(block: Block, length: int) -> bytes:
+        return bytes((palette_index(block.colour),)) * length
+
+
+class BitBoard:
+    """A flattened board stored as one bit-plane per colour, as returned by
+    flatten_bits.
+
+    Each plane is an int whose bit i * size + j is set iff the unit cell at
+    column i and row j is of that plane's colour. Scoring works on whole
+    planes with shifts, masks and popcounts, instead of cell by cell.
+
+    Instance Attributes:
+    - size: The width and height of the board, in unit cells.
+    - planes: The bit-plane of each colour, indexed by its index in PALETTE.
+    """
+    size: int
+    planes: list[int]
+
+    def __init__(self, size: int) -> None:
+        """Initialize a board <size> cells wide with no cells set.
+        """
+        self.size = size
+        self.planes = []
+
+    def __len__(self) -> int:
+        """Return the width of this board in unit cells.
+        """
+        return self.size
+
+    def copy(self) -> BitBoard:
+        """Return a new BitBoard with the same cells as this one.
+        """
+        result = BitBoard(self.size)
+        result.planes = list(self.planes)
+        return result
+
+    def plane(self, colour: int) -> int:
+        """Return the bit-plane of the colour at index <colour> of PALETTE.
+        """
+        return self.planes[colour] if colour < len(self.planes) else 0
+
+    def square(self, x: int, y: int, width: int) -> int:
+        """Return the mask of the <width> by <width> cells whose upper left
+        cell is column <x>, row <y>.
+
+        >>> bin(BitBoard(4).square(1, 2, 2))
+        '0b110011000000'
+        """
+        n = self.size
+        # A 1 at the start of each of <width> columns.
+        columns = ((1 << (n * width)) - 1) // ((1 << n) - 1)
+        return (((1 << width) - 1) << y) * columns << (x * n)
+
+    def paint(self, x: int, y: int, width: int, colour: int) -> None:
+        """Set the cells of the square at column <x>, row <y> and <width>
+        cells wide to the colour at index <colour> of PALETTE.
+        """
+        mask = self.square(x, y, width)
+        while len(self.planes) <= colour:
+            self.planes.append(0)
+        for i, plane in enumerate(self.planes):
+            if plane & mask:
+                self.planes[i] = plane & ~mask
+        self.planes[colour] |= mask
+
+    def perimeter(self, colour: int) -> int:
+        """Return the number of cells on the edge of this board of the colour
+        at index <colour> of PALETTE, with corner cells counted twice.
+
+        >>> board = BitBoard(2)
+        >>> board.paint(0, 0, 2, 1)
+        >>> board.paint(1, 1, 1, 0)
+        >>> board.perimeter(1), board.perimeter(0)
+        (6, 2)
+        """
+        n = self.size
+        plane = self.plane(colour)
+        top = ((1 << (n * n)) - 1) // ((1 << n) - 1)
+        left = (1 << n) - 1
+        return ((plane & top).bit_count()
+                + (plane & top << (n - 1)).bit_count()
+                + (plane & left).bit_count()
+                + (plane & left << (n * (n - 1))).bit_count())
+
+    def largest_blob(self, colour: int) -> int:
+        """Return the number of cells in the largest connected blob of the
+        colour at index <colour> of PALETTE.
+
+        Each blob is found by growing its lowest cell, one step in every
+        direction at a time, within the plane of its colour until it stops
+        changing. Shifting a plane by one moves every cell to the next column
+        or row at once; cells moved across the top or bottom edge into the
+        next column are masked off.
+
+        >>> board = BitBoard(4)
+        >>> board.paint(0, 0, 4, 0)
+        >>> board.paint(0, 0, 2, 1)
+        >>> board.paint(2, 0, 1, 1)
+        >>> board.paint(2, 2, 2, 1)
+        >>> board.largest_blob(1), board.largest_blob(0)
+        (5, 4)
+        """
+        n = self.size
+        top = ((1 << (n * n)) - 1) // ((1 << n) - 1)
+        not_top, not_bottom = ~top, ~(top << (n - 1))
+        plane = self.plane(colour)
+        largest = 0
+        while plane:
+            blob = plane & -plane
+            while True:
+                grown = (blob | blob << n | blob >> n | (blob << 1) & not_top
+                         | (blob >> 1) & not_bottom) & plane
+                if grown == blob:
+                    break
+                blob = grown
+            largest = max(largest, blob.bit_count())
+            plane &= ~blob
+        return largest
+
+
+class _BitGrid(_FlatGrid):
+    """A flattened grid stored as a BitBoard, as returned by flatten_bits.
+    """
+
+    @staticmethod
+    def _blank(grid_size: int) -> BitBoard:
+        return BitBoard(grid_size)
+
+    @classmethod
+    def _fill(cls, grid: BitBoard, block: Block,
+              square: tuple[int, int, int],
+              region: tuple[int, int, int] | None) -> None:
+        """Set the cells of <grid> covered by <block> to the colour of the
+        leaf covering them, as in _FlatGrid._fill.
+
+        Every region is the square of some block, so the cells set by each
+        leaf are a square of their own and are painted in one step.
+        """
+        x, y, width = square
+        if region is not None:
+            region_x, region_y, region_width = region
+            if region_width < width:
+                if not (x <= region_x < x + width
+                        and y <= region_y < y + width):
+                    return
+                if not block.children:
+                    x, y, width = region
+            elif not (region_x <= x < region_x + region_width
+                      and region_y <= y < region_y + region_width):
+                return
+        if not block.children:
+            grid.paint(x, y, width, palette_index(block.colour))
+            return
+        half = width // 2
+        for child, (dx, dy) in zip(block.children, _CHILD_OFFSETS):
+            cls._fill(grid, child, (x + dx * half, y + dy * half, half),
+                      region)
+
+
+class TranspositionTable:
+    """A bounded table of goal scores for boards that have been scored
+    before.
+
+    Scores are keyed by the board's Block.zobrist_hash, or the node of a
+    PersistentBlock, along with the board's max_depth, the type of goal and
+    its target colour. Once the table is full, the score
+    used least recently is dropped to make room. A table can be used by
+    several threads at once.
+
+    Instance Attributes:
+    - capacity: The most scores this table keeps.
+    - hits: The number of lookups that found a score.
+    - misses: The number of lookups that did not find a score.
+
+    Private Instance Attributes:
+    - _scores: The scores in this table, least recently used first.
+    - _lock: The lock held while this table is read or changed.
     """
+    capacity: int
+    hits: int
+    misses: int
+    _scores: OrderedDict[tuple[Any, ...], int]
+    _lock: Lock
 
-    grid_size = 2 ** block.max_depth
-    block_unit_size = block.size // grid_size
-    colour_grid = [[(0, 0, 0) for _ in range(grid_size)]
-                   for _ in range(grid_size)]
+    def __init__(self, capacity: int) -> None:
+        """Initialize an empty table that keeps at most <capacity> scores.
 
-    def fulfill_colour(current_block: Block) -> None:
-        if not current_block.children:
-            start_point = current_block.position[1] // block_unit_size,  \
-                current_block.position[0] // block_unit_size
-            fill_length = 2 ** (block.max_depth - current_block.level)
-            for i in range(start_point[0], start_point[0] + fill_length):
-                for j in range(start_point[1], start_point[1] + fill_length):
-                    colour_grid[j][i] = current_block.colour
+        Preconditions:
+        - capacity > 0
+        """
+        self.capacity = capacity
+        self.hits = 0
+        self.misses = 0
+        self._scores = OrderedDict()
+        self._lock = Lock()
+
+    def __len__(self) -> int:
+        """Return the number of scores in this table.
+        """
+        return len(self._scores)
+
+    def lookup(self, key: tuple[Any, ...]) -> int | None:
+        """Return the score stored for <key>, or None if there is none.
+        """
+        with self._lock:
+            score = self._scores.get(key)
+            if score is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+                self._scores.move_to_end(key)
+            return score
+
+    def store(self, key: tuple[Any, ...], score: int) -> None:
+        """Store <score> for <key>, dropping the least recently used score if
+        this table is full.
+        """
+        with self._lock:
+            self._scores[key] = score
+            self._scores.move_to_end(key)
+            if len(self._scores) > self.capacity:
+                self._scores.popitem(last=False)
+
+    def clear(self) -> None:
+        """Remove every score from this table and reset its counters.
+        """
+        with self._lock:
+            self._scores.clear()
+            self.hits = 0
+            self.misses = 0
+
+
+# The table every goal consults before scoring a board.
+SCORE_TABLE = TranspositionTable(SCORE_TABLE_CAPACITY)
+
+
+def _table_key(goal: Goal, board: Block) -> tuple[Any, ...] | None:
+    """Return the key under which <goal>'s score for <board> is stored in
+    SCORE_TABLE, or None if scores for <board> are not stored there.
+
+    A PersistentBlock is keyed by its node, which is hashable and never
+    changes. Other views of a board, such as an ArrayBlock, have neither a
+    hash nor an immutable node, so their scores are not stored.
+    """
+    if isinstance(board, Block):
+        return board.zobrist_hash(), board.max_depth, type(goal), goal.colour
+    if isinstance(board, PersistentBlock):
+        return (PersistentBlock, board.node, board.level, board.max_depth,
+                type(goal), goal.colour)
+    return None
+
+
+# The edges of the board, as bits of an edge set.
+_TOP, _RIGHT, _BOTTOM, _LEFT = 1, 2, 4, 8
+# The edges of a block that each of its children touches, in the order of
+# Block.children.
+_CHILD_EDGES = (_TOP | _RIGHT, _TOP | _LEFT, _BOTTOM | _LEFT, _BOTTOM | _RIGHT)
+
+
+@hot
+def _perimeter_counts(board: Block) -> dict[tuple[int, int, int], int]:
+    """Return the number of unit cells of each colour on the perimeter of
+    <board>, with corner cells counted twice.
+
+    A whole board no deeper than _MAX_BIT_DEPTH is counted with popcounts
+    over the edges of its BitBoard. Otherwise, only blocks touching an edge
+    of <board> are visited: a leaf that touches k edges and is w unit cells
+    wide adds k * w cells of its colour, which counts a corner cell once for
+    each of its two edges.
+    """
+    if board.level == 0 and board.max_depth <= _MAX_BIT_DEPTH:
+        bits = _BitGrid.of(board)
+        return {PALETTE[colour]: bits.perimeter(colour)
+                for colour in range(len(bits.planes))}
+    counts = {}
+    stack = [(board, _TOP | _RIGHT | _BOTTOM | _LEFT)]
+    while stack:
+        block, edges = stack.pop()
+        children = block.children
+        if not children:
+            width = 2 ** (block.max_depth - block.level)
+            touching = bin(edges).count('1')
+            counts[block.colour] = counts.get(block.colour, 0) \
+                + touching * width
+        else:
+            for child, child_edges in zip(children, _CHILD_EDGES):
+                if edges & child_edges:
+                    stack.append((child, edges & child_edges))
+    return counts
+
+
+class _Blobs:
+    """A union-find structure over pieces of the board, each covering some
+    number of unit cells, used to find connected blobs.
+
+    Instance Attributes:
+    - parent: The piece each piece was last joined to, or itself if it is
+              the representative of its blob.
+    - sizes: For each representative, the number of cells in its blob.
+    """
+    parent: list[int]
+    sizes: list[int]
+
+    def __init__(self) -> None:
+        """Initialize a structure with no pieces.
+        """
+        self.parent = []
+        self.sizes = []
+
+    def add(self, size: int) -> int:
+        """Add a piece covering <size> cells, in a blob of its own, and return
+        its number.
+        """
+        piece = len(self.parent)
+        self.parent.append(piece)
+        self.sizes.append(size)
+        return piece
+
+    def find(self, piece: int) -> int:
+        """Return the representative of the blob containing <piece>.
+        """
+        parent = self.parent
+        while parent[piece] != piece:
+            parent[piece] = parent[parent[piece]]
+            piece = parent[piece]
+        return piece
+
+    def union(self, piece1: int, piece2: int) -> None:
+        """Join the blobs containing <piece1> and <piece2>.
+        """
+        root1, root2 = self.find(piece1), self.find(piece2)
+        if root1 == root2:
+            return
+        if self.sizes[root1] > self.sizes[root2]:
+            root1, root2 = root2, root1
+        self.parent[root1] = root2
+        self.sizes[root2] += self.sizes[root1]
+
+    def largest(self) -> int:
+        """Return the number of cells in the largest blob, or 0 if there are
+        no pieces.
+        """
+        return max((self.sizes[piece] for piece in range(len(self.parent))
+                    if self.parent[piece] == piece), default=0)
+
+
+def _join_runs(columns: list[bytearray], target: int,
+               blobs: _Blobs) -> list[list[tuple[int, int, int]]]:
+    """Add the runs of cells equal to <target> in <columns>, a grid returned
+    by flatten_palette, to <blobs> as pieces, joining runs that touch.
+
+    Return the (start, end, piece) of each run, column by column, where the
+    run covers rows start to end - 1 of its column.
+
+    The runs of each column are found with bytearray searches, and runs in
+    neighbouring columns that share a row are joined, so each run is visited
+    once, without recursion.
+    """
+    is_target = bytes(1 if i == target else 0 for i in range(256))
+    result = []
+    previous = []
+    for column in columns:
+        mask = column.translate(is_target)
+        current = []
+        k = 0
+        start = mask.find(1)
+        while start != -1:
+            end = mask.find(0, start)
+            if end == -1:
+                end = len(mask)
+            run = blobs.add(end - start)
+            while k < len(previous) and previous[k][1] <= start:
+                k += 1
+            j = k
+            while j < len(previous) and previous[j][0] < end:
+                blobs.union(run, previous[j][2])
+                j += 1
+            current.append((start, end, run))
+            start = mask.find(1, end)
+        result.append(current)
+        previous = current
+    return result
+
+
+@hot
+def _largest_blob_size(columns: list[bytearray], target: int) -> int:
+    """Return the number of cells in the largest connected blob of cells equal
+    to <target> in <columns>, a grid returned by flatten_palette.
+    """
+    blobs = _Blobs()
+    _join_runs(columns, target, blobs)
+    return blobs.largest()
+
+
+class _BlobTracker:
+    """The connected blobs of every colour on a board, kept up to date as
+    the board changes.
+
+    A _BlobTracker observes its board (see Block.add_observer). Each action on
+    the board marks the square of cells covered by the block it changed. The
+    next query relabels only the blobs touching a marked square, which are
+    the only ones that can have changed. Relabelling a blob visits each of
+    its cells, while labelling the whole board visits each run of cells, so
+    when the touched blobs have more cells than the board has runs, every
+    blob is relabelled instead.
+
+    Instance Attributes:
+    - board: The board whose blobs are tracked.
+
+    Private Instance Attributes:
+    - _labels: The blob of each cell; cell (i, j) is at index i * n + j, where
+               n is the width of the board in cells.
+    - _sizes: For each colour index, the number of cells in each of its blobs.
+    - _colours: The colour index of each blob.
+    - _bounds: The (left, top, right, bottom) of the cells of each blob, with
+               right and bottom exclusive.
+    - _next_label: The label the next new blob gets.
+    - _runs: The number of runs of cells found when every blob was last
+             labelled.
+    - _dirty: The (x, y, width) of each square of cells that may have
+              changed, or None if every blob has to be relabelled.
+
+    The blobs found after a series of actions, and after the actions are
+    rolled back, are the blobs found by labelling the board afresh:
+
+    >>> from block import Journal, ROT_CW, SWAP_VERT
+    >>> random.seed(1)
+    >>> board = Block((0, 0), 768, COLOUR_LIST[0], 0, 5)
+    >>> level = [board]
+    >>> while level:
+    ...     level = [child for block in level if block.smash()
+    ...              for child in block.children]
+    >>> tracker = _BlobTracker.of(board)
+    >>> def agrees() -> bool:
+    ...     columns = flatten_palette(board.create_copy())
+    ...     return all(tracker.largest(i) == _largest_blob_size(columns, i)
+    ...                for i in range(len(PALETTE)))
+    >>> journal = Journal(board)
+    >>> results = []
+    >>> for _ in range(30):
+    ...     block = board
+    ...     while block.children and random.random() < 0.9:
+    ...         block = random.choice(block.children)
+    ...     name, *args = random.choice([('rotate', ROT_CW),
+    ...                                  ('swap', SWAP_VERT), ('combine',),
+    ...                                  ('smash',), ('paint', COLOUR_LIST[1])])
+    ...     _ = getattr(block, name)(*args)
+    ...     results.append(agrees())
+    >>> len(journal), all(results)
+    (10, True)
+    >>> journal.rollback()
+    >>> agrees()
+    True
+    """
+    board: Block
+    _labels: list[int]
+    _sizes: dict[int, dict[int, int]]
+    _colours: dict[int, int]
+    _bounds: dict[int, tuple[int, int, int, int]]
+    _next_label: int
+    _runs: int
+    _dirty: list[tuple[int, int, int]] | None
+
+    def __init__(self, board: Block) -> None:
+        """Start tracking the blobs of <board>.
+
+        Preconditions:
+        - board.level == 0
+        """
+        self.board = board
+        self._labels = []
+        self._sizes = {}
+        self._colours = {}
+        self._bounds = {}
+        self._next_label = 0
+        self._runs = 0
+        self._dirty = None
+        board.add_observer(self)
+
+    @classmethod
+    def of(cls, board: Block) -> _BlobTracker:
+        """Return the tracker of <board>, creating it if it has none.
+        """
+        tracker = board.find_observer(cls)
+        return tracker if tracker is not None else cls(board)
+
+    def block_changed(self, block: Block, action: str, undo: Any) -> None:
+        """Mark the cells covered by <block> as changed.
+        """
+        if self._dirty is None:
+            return
+        if len(self._dirty) >= 2 ** self.board.max_depth:
+            self._dirty = None
+        else:
+            self._dirty.append(_cell_region(block))
+
+    def largest(self, colour: int) -> int:
+        """Return the number of cells in the largest blob of the colour at
+        index <colour> of PALETTE.
+        """
+        self._update()
+        return max(self._sizes.get(colour, {}).values(), default=0)
+
+    def _update(self) -> None:
+        """Relabel the blobs that may have changed since the last query.
+        """
+        columns = _PaletteGrid.of(self.board)
+        if self._dirty is None:
+            self._rebuild(columns)
+        elif self._dirty:
+            self._relabel(columns)
+        self._dirty = []
+
+    def _rebuild(self, columns: list[bytearray]) -> None:
+        """Label every blob of <columns> from scratch.
+        """
+        n = len(columns)
+        self._labels = [0] * (n * n)
+        self._sizes = {}
+        self._colours = {}
+        self._bounds = {}
+        blobs = _Blobs()
+        for colour in range(len(PALETTE)):
+            runs = _join_runs(columns, colour, blobs)
+            sizes = self._sizes.setdefault(colour, {})
+            for i in range(n):
+                for start, end, run in runs[i]:
+                    label = blobs.find(run)
+                    self._labels[i * n + start:i * n + end] = \
+                        [label] * (end - start)
+                    sizes[label] = blobs.sizes[label]
+                    self._colours[label] = colour
+                    left, top, right, bottom = self._bounds.get(
+                        label, (i, start, i + 1, end))
+                    self._bounds[label] = (min(left, i), min(top, start),
+                                           max(right, i + 1),
+                                           max(bottom, end))
+        self._next_label = len(blobs.parent)
+        self._runs = len(blobs.parent)
+
+    def _relabel(self, columns: list[bytearray]) -> None:
+        """Relabel the blobs touching the squares in self._dirty, or every
+        blob if that is cheaper.
+        """
+        n = len(columns)
+        labels = self._labels
+        touched = set()
+        for x, y, width in self._dirty:
+            top, bottom = max(0, y - 1), min(n, y + width + 1)
+            for i in range(max(0, x - 1), min(n, x + width + 1)):
+                touched.update(labels[i * n + top:i * n + bottom])
+        cost = sum(self._sizes[self._colours[label]][label]
+                   for label in touched)
+        if cost > self._runs:
+            self._rebuild(columns)
+            return
+
+        # Forget the touched blobs, marking their cells with -1.
+        cells = []
+        for label in touched:
+            left, top, right, bottom = self._bounds.pop(label)
+            del self._sizes[self._colours.pop(label)][label]
+            for i in range(left, right):
+                for cell in range(i * n + top, i * n + bottom):
+                    if labels[cell] == label:
+                        labels[cell] = -1
+                        cells.append(cell)
+
+        # Label the forgotten cells again, one blob at a time.
+        for cell in cells:
+            if labels[cell] == -1:
+                self._flood(columns, cell)
+
+    @hot
+    def _flood(self, columns: list[bytearray], cell: int) -> None:
+        """Give a new label to the blob of unlabelled cells containing
+        <cell>.
+        """
+        n = len(columns)
+        labels = self._labels
+        label = self._next_label
+        self._next_label += 1
+        colour = columns[cell // n][cell % n]
+        size = 0
+        left, top, right, bottom = n, n, 0, 0
+        labels[cell] = label
+        stack = [cell]
+        while stack:
+            cell = stack.pop()
+            i, j = divmod(cell, n)
+            size += 1
+            left, top = min(left, i), min(top, j)
+            right, bottom = max(right, i + 1), max(bottom, j + 1)
+            for neighbour, inside in ((cell - n, i > 0), (cell + n, i < n - 1),
+                                      (cell - 1, j > 0), (cell + 1, j < n - 1)):
+                if inside and labels[neighbour] == -1 \
+                        and columns[neighbour // n][neighbour % n] == colour:
+                    labels[neighbour] = label
+                    stack.append(neighbour)
+        self._sizes.setdefault(colour, {})[label] = size
+        self._colours[label] = colour
+        self._bounds[label] = (left, top, right, bottom)
+
+
+# The deepest board whose blobs are found on its flattened grid. Deeper boards
+# are scored from their leaves.
+_MAX_GRID_DEPTH = 10
+# The deepest board scored on its BitBoard. Past this depth, growing a blob
+# one step at a time across whole planes costs more than labelling runs.
+_MAX_BIT_DEPTH = 6
+
+
+def _leaf_key(leaf: Block) -> Any:
+    """Return a key that is the same for every handle to <leaf>, and differs
+    from the key of every other leaf of its board.
+
+    A Block is its own leaf, so it is keyed by its id. ArrayBlock and
+    PersistentBlock handles are made afresh each time their parent's
+    children are read, so they are keyed by where they are instead.
+    """
+    if isinstance(leaf, ArrayBlock):
+        return leaf.board, leaf.index
+    if isinstance(leaf, PersistentBlock):
+        return leaf.path
+    return id(leaf)
+
+
+@hot
+def _largest_leaf_blob(board: Block, colour: tuple[int, int, int]) -> int:
+    """Return the number of unit cells in the largest connected blob of
+    <colour> on <board>, working from its leaves instead of its cells.
+
+    Each leaf of <colour> is a piece of a blob covering its area in unit cells.
+    Leaves are joined when they share an edge. The shared edges are found by
+    matching, for each block, the sides of its children that face each other,
+    so the work grows with the number of leaves and not with 4^max_depth.
+    """
+    blobs = _Blobs()
+    pieces = {}
+
+    def piece(leaf: Block) -> int | None:
+        """Return the piece for <leaf>, or None if it is not of <colour>.
+        """
+        if leaf.colour != colour:
+            return None
+        key = _leaf_key(leaf)
+        if key not in pieces:
+            width = 2 ** (leaf.max_depth - leaf.level)
+            pieces[key] = blobs.add(width * width)
+        return pieces[key]
+
+    def join(first: Block, second: Block, horizontal: bool) -> None:
+        """Join the leaves along the side where <first> meets <second>.
+
+        If <horizontal>, <first> is to the left of <second>; otherwise it is
+        above <second>.
+        """
+        first_children, second_children = first.children, second.children
+        if not first_children and not second_children:
+            piece1, piece2 = piece(first), piece(second)
+            if piece1 is not None and piece2 is not None:
+                blobs.union(piece1, piece2)
             return
-        for child in current_block.children:
-            fulfill_colour(child)
+        # The children along the facing sides, paired top to bottom when
+        # <horizontal> and left to right otherwise.
+        if horizontal:
+            firsts = (first_children[0], first_children[3]) \
+                if first_children else (first, first)
+            seconds = (second_children[1], second_children[2]) \
+                if second_children else (second, second)
+        else:
+            firsts = (first_children[2], first_children[3]) \
+                if first_children else (first, first)
+            seconds = (second_children[1], second_children[0]) \
+                if second_children else (second, second)
+        join(firsts[0], seconds[0], horizontal)
+        join(firsts[1], seconds[1], horizontal)
+
+    stack = [board]
+    while stack:
+        block = stack.pop()
+        children = block.children
+        if not children:
+            piece(block)
+            continue
+        join(children[1], children[0], True)
+        join(children[2], children[3], True)
+        join(children[1], children[2], False)
+        join(children[0], children[3], False)
+        stack.extend(children)
+    return blobs.largest()
+
+
+@hot
+def _largest_blob(board: Block, colour: tuple[int, int, int]) -> int:
+    """Return the number of unit cells in the largest connected blob of
+    <colour> on <board>.
+
+    Boards deeper than _MAX_GRID_DEPTH are scored from their leaves, so
+    their grid of cells is never built, and boards no deeper than
+    _MAX_BIT_DEPTH are scored on their BitBoard. Other whole boards made of
+    Blocks keep a _BlobTracker, which only relabels the blobs near the blocks
+    changed since it was last asked.
+    """
+    if board.max_depth - board.level > _MAX_GRID_DEPTH:
+        return _largest_leaf_blob(board, colour)
+    if board.max_depth - board.level <= _MAX_BIT_DEPTH:
+        return _BitGrid.of(board).largest_blob(palette_index(colour))
+    if board.level == 0 and isinstance(board, Block):
+        return _BlobTracker.of(board).largest(palette_index(colour))
+    return _largest_blob_size(_PaletteGrid.of(board),
+                              palette_index(colour))
 
-    fulfill_colour(block)
-    return colour_grid
+
+@hot
+def score_all(board: Block, goals: list[Goal]) -> dict[Goal, int]:
+    """Return the score of each goal in <goals> on <board>.
+
+    This gives the same scores as calling each goal's score method, but the
+    work is shared between the goals: the perimeter of every colour is
+    counted in one pass over the board, and every blob goal uses the same
+    flattened board. Scores are looked up in SCORE_TABLE first, and stored
+    there once computed.
+
+    >>> board = Block((0, 0), 750, COLOUR_LIST[0], 0, 1)
+    >>> goals = [PerimeterGoal(COLOUR_LIST[0]), BlobGoal(COLOUR_LIST[1])]
+    >>> list(score_all(board, goals).values())
+    [8, 0]
+    """
+    scores = {}
+    perimeters = None
+    for goal in goals:
+        key = _table_key(goal, board)
+        score = None if key is None else SCORE_TABLE.lookup(key)
+        if score is None:
+            if isinstance(goal, PerimeterGoal):
+                if perimeters is None:
+                    perimeters = _perimeter_counts(board)
+                score = perimeters.get(goal.colour, 0)
+            elif isinstance(goal, BlobGoal):
+                score = _largest_blob(board, goal.colour)
+            else:
+                score = goal.score(board)
+            if key is not None:
+                SCORE_TABLE.store(key, score)
+        scores[goal] = score
+    return scores
 
 
 class Goal:
@@ -112,6 +1080,7 @@ class PerimeterGoal(Goal):
     on the board's perimeter.
     """
 
+    @hot
     def score(self, board: Block) -> int:
         """Return the current score for this goal on the given board.
 
@@ -120,33 +1089,27 @@ class PerimeterGoal(Goal):
         The score for a PerimeterGoal is defined to be the number of unit cells
         on the perimeter whose colour is this goal's target colour. Corner cells
         count twice toward the score.
+
+        Scores are looked up in SCORE_TABLE first, and stored there once
+        computed.
         """
-        colour_to_count = self.colour
-        perimeter_count = 0
-        flat_board = flatten(board)
-        colour_map = {
-            (1, 128, 181): "Blue",
-            (138, 151, 71): "Green",
-            (199, 44, 58): "Red",
-            (255, 211, 92): "Yellow"
-        }
-        colour_names = [["" for _ in range(len(flat_board))]
-                        for _ in range(len(flat_board))]
-        for i in range(len(flat_board)):
-            for j in range(len(flat_board)):
-                colour_names[i][j] = colour_map[flat_board[i][j]]
-
-        board_size = len(flat_board)
-        for i in range(board_size):
-            if flat_board[i][0] == colour_to_count:
-                perimeter_count += 1
-            if flat_board[i][board_size - 1] == colour_to_count:
-                perimeter_count += 1
-            if flat_board[0][i] == colour_to_count:
-                perimeter_count += 1
-            if flat_board[board_size - 1][i] == colour_to_count:
-                perimeter_count += 1
-        return perimeter_count
+        key = _table_key(self, board)
+        score = None if key is None else SCORE_TABLE.lookup(key)
+        if score is None:
+            score = self._perimeter_count(board)
+            if key is not None:
+                SCORE_TABLE.store(key, score)
+        return score
+
+    def _perimeter_count(self, board: Block) -> int:
+        """Return the score for this goal on <board>, without consulting
+        SCORE_TABLE.
+
+        Whole boards no deeper than _MAX_BIT_DEPTH are scored on their
+        BitBoard. Otherwise, only the blocks that touch the edge of the board
+        are visited, so the board is never flattened.
+        """
+        return _perimeter_counts(board).get(self.colour, 0)
 
     def description(self) -> str:
         """Return a description of this goal.
@@ -160,6 +1123,7 @@ class BlobGoal(Goal):
     colour, anywhere within the Block.
     """
 
+    @hot
     def score(self, board: Block) -> int:
         """Return the current score for this goal on the given board.
 
@@ -167,17 +1131,17 @@ class BlobGoal(Goal):
 
         The score for a BlobGoal is defined to be the total number of
         unit cells in the largest connected blob within this Block.
+
+        Scores are looked up in SCORE_TABLE first, and stored there once
+        computed.
         """
-        result = 0
-        flattened_board = flatten(board)
-        n = len(flattened_board)
-        visited = [[-1 for _ in range(n)] for _ in range(n)]
-        for i in range(n):
-            for j in range(n):
-                if visited[i][j] == -1 and flattened_board[i][j] == self.colour:
-                    result = max(result, self._undiscovered_blob_size(
-                        (i, j), flattened_board, visited))
-        return result
+        key = _table_key(self, board)
+        score = None if key is None else SCORE_TABLE.lookup(key)
+        if score is None:
+            score = _largest_blob(board, self.colour)
+            if key is not None:
+                SCORE_TABLE.store(key, score)
+        return score
 
     def _undiscovered_blob_size(self, pos: tuple[int, int],
                                 board: list[list[tuple[int, int, int]]],
@@ -199,21 +1163,23 @@ class BlobGoal(Goal):
         either 0 or 1.
 
         If <pos> is out of bounds for <board>, return 0.
+
+        The search keeps its own stack of cells, so blobs of any size can be
+        measured without reaching Python's recursion limit.
         """
-        def get_neighbour(i: int, j: int) -> list[(int, int)]:
-            ns = [(i + 1, j), (i - 1, j), (i, j + 1), (i, j - 1)]
-            return [n for n in ns if 0 <= n[0] < len(board)
-                    and 0 <= n[1] < len(board)]
-        i, j = pos
-        if visited[i][j] != -1:
-            return 0
-        visited[i][j] = 0
-        if board[i][j] != self.colour:
-            return 0
-        visited[i][j] = 1
-        result = 1
-        for neighbour in get_neighbour(i, j):
-            result += self._undiscovered_blob_size(neighbour, board, visited)
+        n = len(board)
+        result = 0
+        stack = [pos]
+        while stack:
+            i, j = stack.pop()
+            if not (0 <= i < n and 0 <= j < n) or visited[i][j] != -1:
+                continue
+            visited[i][j] = 0
+            if board[i][j] != self.colour:
+                continue
+            visited[i][j] = 1
+            result += 1
+            stack.extend([(i + 1, j), (i - 1, j), (i, j + 1), (i, j - 1)])
         return result
 
     def description(self) -> str:
@@ -228,7 +1194,8 @@ if __name__ == '__main__':
     python_ta.check_all(config={
         'allowed-import-modules': [
             'doctest', 'python_ta', 'random', 'typing', 'block', 'settings',
-            'math', '__future__'
+            'math', '__future__', 'collections', 'threading', 'instrument',
+            'persistent', 'quadtree'
         ],
         'max-attributes': 15
     })
@@ -0,0 +1,313 @@
+"""CSC148 Assignment 2
+
+CSC148 Winter 2024
+Department of Computer Science,
+University of Toronto
+
+This code is provided solely for the personal and private use of
+students taking the CSC148 course at the University of Toronto.
+Copying for purposes other than this use is expressly prohibited.
+All forms of distribution of this code, whether as given or with
+any changes, are expressly prohibited.
+
+Authors: Diane Horton, David Liu, Mario Badr, Sophia Huynh, Misha Schwartz,
+Jaisie Sin, and Joonho Kim
+
+All of the files in this directory and all subdirectories are:
+Copyright (c) Diane Horton, David Liu, Mario Badr, Sophia Huynh,
+Misha Schwartz, Jaisie Sin, and Joonho Kim
+
+Module Description:
+
+This file contains opt-in instrumentation for the hot functions of the game.
+
+Functions are marked as hot with the hot decorator, which only records them
+and returns them unchanged, so marking a function costs nothing. Once
+enable() is called, every hot function is replaced, wherever it was looked up
+from, with a wrapper that counts its calls and the time spent in them, and
+records each call as an event. disable() puts the original functions back.
+
+Code can also mark a span of time, such as one computer player's move, with
+span(). A span records how many times each hot function was called in its
+thread during it, and any values given to annotate() while it is open. When
+instrumentation is disabled, span() and annotate() do nothing.
+
+The events and spans recorded can be exported in the Chrome trace event
+format, to be viewed as a timeline in chrome://tracing or Perfetto. At most
+MAX_EVENTS events are kept: once there are that many, calls to hot functions
+are still counted and timed, but are no longer recorded as events.
+
+Only calls made in this process are recorded, so moves assessed in worker
+processes are not.
+"""
+from __future__ import annotations
+from contextlib import contextmanager
+from functools import wraps
+from threading import Lock, get_ident, local
+from typing import Any, Callable, Iterator, TypeVar
+import json
+import os
+import sys
+import time
+
+_Function = TypeVar('_Function', bound=Callable)
+
+# The most events kept at once. Spans are recorded past this limit, but calls
+# to hot functions are not.
+MAX_EVENTS = 100_000
+
+# The hot functions, by name: the name of each function within its module,
+# such as 'Block.create_copy', mapped to the function.
+_HOT: dict[str, Callable] = {}
+
+# Whether instrumentation is enabled, and the wrapper of each hot function, by
+# name, while it is.
+_enabled = False
+_WRAPPERS: dict[str, Callable] = {}
+
+# The number of calls to each hot function, by name, and the total number of
+# nanoseconds spent in them, since instrumentation was last reset, and the lock
+# held while they are updated.
+_CALLS: dict[str, int] = {}
+_NANOSECONDS: dict[str, int] = {}
+_COUNTS_LOCK = Lock()
+
+# The events recorded since instrumentation was last reset, in the Chrome
+# trace event format, the time, in nanoseconds, they are measured from, and
+# the number of calls to hot functions not recorded as events because there
+# were already MAX_EVENTS events.
+_EVENTS: list[dict[str, Any]] = []
+_start_ns = 0
+_dropped = 0
+
+# The state of each thread: the hot functions it is inside, the number of
+# calls it has made to each of them, and the arguments of the spans it is
+# inside, innermost last.
+_THREAD = local()
+
+
+def hot(function: _Function) -> _Function:
+    """Mark <function> as a hot function, and return it unchanged.
+
+    <function> must be a function defined at the top level of its module, or
+    a method defined in a class at the top level of its module.
+    """
+    _HOT[function.__qualname__] = function
+    return function
+
+
+def is_enabled() -> bool:
+    """Return whether instrumentation is enabled.
+    """
+    return _enabled
+
+
+def enable() -> None:
+    """Start recording the calls to every hot function, and every span.
+
+    The counts and events recorded so far are kept; use reset() to clear
+    them. Do nothing if instrumentation is already enabled.
+    """
+    global _enabled, _start_ns
+    if _enabled:
+        return
+    _enabled = True
+    if not _EVENTS:
+        _start_ns = time.perf_counter_ns()
+    for name, function in _HOT.items():
+        _WRAPPERS[name] = _wrap(name, function)
+    _rebind(_HOT, _WRAPPERS)
+
+
+def disable() -> None:
+    """Stop recording, and put back the original hot functions.
+
+    The counts and events recorded are kept.
+    """
+    global _enabled
+    _enabled = False
+    _rebind(_WRAPPERS, _HOT)
+    _WRAPPERS.clear()
+
+
+def reset() -> None:
+    """Clear the counts and events recorded so far.
+    """
+    global _start_ns, _dropped
+    _CALLS.clear()
+    _NANOSECONDS.clear()
+    _EVENTS.clear()
+    _start_ns = time.perf_counter_ns()
+    _dropped = 0
+
+
+def _rebind(old: dict[str, Callable], new: dict[str, Callable]) -> None:
+    """Replace each function in <old> with the function of the same name in
+    <new>: in the class or module that defines it, and in every module that
+    imported it by name.
+    """
+    for name, function in old.items():
+        owner_name, _, attribute = name.rpartition('.')
+        module = sys.modules[function.__module__]
+        if owner_name:
+            setattr(getattr(module, owner_name), attribute, new[name])
+        else:
+            for other in list(sys.modules.values()):
+                if getattr(other, '__dict__', {}).get(attribute) is function:
+                    setattr(other, attribute, new[name])
+
+
+def _wrap(name: str, function: Callable) -> Callable:
+    """Return a wrapper for the hot function <function>, called <name>, that
+    records its calls.
+
+    A call from within another call to the same function, as in recursion,
+    is part of that call, and is not counted or timed separately.
+    """
+    @wraps(function)
+    def wrapper(*args: Any, **kwargs: Any) -> Any:
+        inside = _inside()
+        if name in inside:
+            return function(*args, **kwargs)
+        inside.add(name)
+        start = time.perf_counter_ns()
+        try:
+            return function(*args, **kwargs)
+        finally:
+            end = time.perf_counter_ns()
+            inside.discard(name)
+            with _COUNTS_LOCK:
+                _CALLS[name] = _CALLS.get(name, 0) + 1
+                _NANOSECONDS[name] = _NANOSECONDS.get(name, 0) + end - start
+            _THREAD.calls[name] = _THREAD.calls.get(name, 0) + 1
+            _record(name, 'hot', start, end, {})
+    return wrapper
+
+
+def _inside() -> set[str]:
+    """Return the names of the hot functions this thread is inside.
+    """
+    if not hasattr(_THREAD, 'inside'):
+        _THREAD.inside = set()
+        _THREAD.calls = {}
+        _THREAD.spans = []
+    return _THREAD.inside
+
+
+def _record(name: str, category: str, start: int, end: int,
+            args: dict[str, Any]) -> None:
+    """Record an event called <name>, in <category>, in this thread, from
+    <start> to <end> nanoseconds, with the arguments <args>.
+
+    Calls to hot functions, in the category 'hot', are not recorded once
+    there are MAX_EVENTS events.
+    """
+    global _dropped
+    if category == 'hot' and len(_EVENTS) >= MAX_EVENTS:
+        _dropped += 1
+        return
+    _EVENTS.append({'name': name, 'cat': category, 'ph': 'X',
+                    'ts': (start - _start_ns) / 1000,
+                    'dur': (end - start) / 1000,
+                    'pid': os.getpid(), 'tid': get_ident(), 'args': args})
+
+
+@contextmanager
+def span(name: str, **args: Any) -> Iterator[None]:
+    """Record the time spent in the body of a with statement as a span
+    called <name>, with the arguments <args>, if instrumentation is enabled.
+
+    The span's arguments also include the number of calls this thread made
+    to each hot function during the span, and anything given to annotate()
+    while it is the innermost span open in this thread.
+
+    >>> enable()
+    >>> with span('example', size=3):
+    ...     annotate(found=True)
+    >>> summary = stats()['spans'][-1]
+    >>> summary['name'], summary['args']
+    ('example', {'size': 3, 'found': True})
+    >>> disable()
+    >>> reset()
+    """
+    if not _enabled:
+        yield
+        return
+    _inside()
+    calls = dict(_THREAD.calls)
+    _THREAD.spans.append(args)
+    start = time.perf_counter_ns()
+    try:
+        yield
+    finally:
+        end = time.perf_counter_ns()
+        _THREAD.spans.pop()
+        for function, count in _THREAD.calls.items():
+            if count != calls.get(function, 0):
+                args[function] = count - calls.get(function, 0)
+        _record(name, 'span', start, end, args)
+
+
+def annotate(**values: Any) -> None:
+    """Add <values> to the arguments of the innermost span open in this
+    thread, if instrumentation is enabled and a span is open.
+    """
+    if _enabled and getattr(_THREAD, 'spans', None):
+        _THREAD.spans[-1].update(values)
+
+
+def stats() -> dict[str, Any]:
+    """Return what has been recorded since instrumentation was last reset.
+
+    Return a dictionary with:
+    - 'functions': for each hot function called, by name, the number of
+      'calls' to it and the total 'seconds' spent in them, slowest first
+    - 'spans': the 'name', 'seconds' and 'args' of each span, in the order
+      they ended
+    - 'dropped_events': the number of calls to hot functions that were
+      counted but not recorded as events, because there were already
+      MAX_EVENTS events
+    """
+    functions = {name: {'calls': _CALLS[name],
+                        'seconds': _NANOSECONDS[name] / 1e9}
+                 for name in sorted(_CALLS, key=_NANOSECONDS.get,
+                                    reverse=True)}
+    spans = [{'name': event['name'], 'seconds': event['dur'] / 1e6,
+              'args': event['args']}
+             for event in _EVENTS if event['cat'] == 'span']
+    return {'functions': functions, 'spans': spans,
+            'dropped_events': _dropped}
+
+
+def chrome_trace() -> dict[str, Any]:
+    """Return the events recorded since instrumentation was last reset, in
+    the Chrome trace event format.
+
+    Each call to a hot function and each span is a complete event, with its
+    start and duration in microseconds.
+    """
+    return {'traceEvents': sorted(_EVENTS, key=lambda event: event['ts']),
+            'displayTimeUnit': 'ms'}
+
+
+def save_trace(path: str) -> None:
+    """Save chrome_trace() to the file at <path>, as JSON.
+    """
+    with open(path, 'w', encoding='utf-8') as file:
+        json.dump(chrome_trace(), file)
+
+
+if __name__ == '__main__':
+    import python_ta
+
+    python_ta.check_all(config={
+        'allowed-import-modules': [
+            'doctest', 'python_ta', 'typing', '__future__', 'contextlib',
+            'functools', 'json', 'os', 'sys', 'threading', 'time'
+        ],
+        'disable': ['W0603']
+    })
+
+    import doctest
+
+    doctest.testmod()
@@ -0,0 +1,401 @@
+"""CSC148 Assignment 2
+
+CSC148 Winter 2024
+Department of Computer Science,
+University of Toronto
+
+This code is provided solely for the personal and private use of
+students taking the CSC148 course at the University of Toronto.
+Copying for purposes other than this use is expressly prohibited.
+All forms of distribution of this code, whether as given or with
+any changes, are expressly prohibited.
+
+Authors: Diane Horton, David Liu, Mario Badr, Sophia Huynh, Misha Schwartz,
+Jaisie Sin, and Joonho Kim
+
+All of the files in this directory and all subdirectories are:
+Copyright (c) Diane Horton, David Liu, Mario Badr, Sophia Huynh,
+Misha Schwartz, Jaisie Sin, and Joonho Kim
+
+Module Description:
+
+This file contains persistent boards. A PersistentBoard is never changed:
+performing an action on it returns a new board that shares every subtree the
+action did not touch with the old one.
+"""
+from __future__ import annotations
+from typing import Any, Union
+import random
+import math
+
+from block import Block, majority, to_block, ROT_CW, ROT_CCW, SWAP_HORZ, \
+    SWAP_VERT
+from settings import COLOUR_LIST
+
+# A node is either the index into COLOUR_LIST of a leaf's colour, or a tuple
+# (rotation, c0, c1, c2, c3) for a node with children. The children c0 to c3
+# are stored before <rotation> more ROT_CW turns are applied to the node, so
+# rotating a node of any size only builds one new tuple.
+Node = Union[int, tuple]
+
+
+def _rotated(node: Node, turns: int) -> Node:
+    """Return <node> rotated clockwise <turns> times.
+    """
+    if isinstance(node, int) or turns % 4 == 0:
+        return node
+    return ((node[0] + turns) % 4,) + node[1:]
+
+
+def _children(node: Node) -> tuple[Node, ...]:
+    """Return the four children of <node> as they appear on the board, in the
+    same order as Block.children.
+
+    Preconditions:
+    - <node> is not a leaf
+    """
+    rotation = node[0]
+    stored = node[1:]
+    if rotation == 0:
+        return stored
+    return tuple(_rotated(stored[(i + rotation) % 4], rotation)
+                 for i in range(4))
+
+
+def _smashed(level: int, max_depth: int) -> Node:
+    """Return a new node at <level> made by smashing a leaf, drawing random
+    numbers in the same order as Block.smash does.
+    """
+    palette = range(len(COLOUR_LIST))
+    children = [random.choice(palette) for _ in range(4)]
+    for i in range(4):
+        if random.random() < math.exp(-0.25 * (level + 1)) \
+                and level + 1 < max_depth:
+            children[i] = _smashed(level + 1, max_depth)
+    return (0,) + tuple(children)
+
+
+def _from_block(block: Block) -> Node:
+    """Return the node equivalent to the tree rooted at <block>.
+    """
+    if not block.children:
+        return COLOUR_LIST.index(block.colour)
+    return (0,) + tuple(_from_block(child) for child in block.children)
+
+
+class PersistentBoard:
+    """An immutable Blocky board.
+
+    The action methods mirror those of Block, but take the path to the block
+    they act on and return a new board instead of True, or None when Block
+    would have returned False. The new board shares every untouched subtree
+    with this one, so an action costs time proportional to the depth of the
+    block it acts on, plus the size of any subtree it creates.
+
+    A path is a sequence of child indexes leading from the root to a block,
+    using the same child order as Block.children.
+
+    Since boards never change, they can be shared freely, including between
+    threads.
+
+    Attributes
+    - root: The root node of this board.
+    - max_depth: The deepest level allowed in this board.
+    - size: The height and width of this board.
+    """
+    __slots__ = ('root', 'max_depth', 'size')
+    root: Node
+    max_depth: int
+    size: int
+
+    def __init__(self, root: Node, max_depth: int, size: int) -> None:
+        """Initialize a board with the given <root>, <max_depth> and <size>.
+        """
+        self.root = root
+        self.max_depth = max_depth
+        self.size = size
+
+    @classmethod
+    def from_block(cls, block: Block) -> PersistentBoard:
+        """Return a new PersistentBoard equivalent to the tree rooted at
+        <block>.
+
+        Preconditions:
+        - block.level == 0
+        """
+        return cls(_from_block(block), block.max_depth, block.size)
+
+    def to_block(self) -> Block:
+        """Return a new Block tree equivalent to this board.
+
+        >>> from block import generate_board
+        >>> board = generate_board(3, 750)
+        >>> PersistentBoard.from_block(board).to_block() == board
+        True
+        """
+        return to_block(self.block())
+
+    def block(self) -> PersistentBlock:
+        """Return a read-only view of the root of this board.
+        """
+        return PersistentBlock(self.root, (), (0, 0), self.size, 0,
+                               self.max_depth)
+
+    def node(self, path: tuple[int, ...]) -> Node:
+        """Return the node at the end of <path>.
+
+        Preconditions:
+        - <path> leads to a node of this board
+        """
+        node = self.root
+        for index in path:
+            node = _children(node)[index]
+        return node
+
+    def smash(self, path: tuple[int, ...]) -> PersistentBoard | None:
+        """Return this board with the block at <path> smashed, or None if that
+        block cannot be smashed.
+        """
+        level = len(path)
+        if not isinstance(self.node(path), int) or level == self.max_depth:
+            return None
+        return self._replace(path, _smashed(level, self.max_depth))
+
+    def swap(self, path: tuple[int, ...],
+             direction: int) -> PersistentBoard | None:
+        """Return this board with the children of the block at <path> swapped
+        in <direction>, or None if that block has no children.
+
+        Precondition:
+        - <direction> is either (SWAP_VERT, SWAP_HORZ)
+        """
+        node = self.node(path)
+        if isinstance(node, int):
+            return None
+        children = _children(node)
+        if direction == SWAP_HORZ:
+            order = (1, 0, 3, 2)
+        elif direction == SWAP_VERT:
+            order = (3, 2, 1, 0)
+        else:
+            return self
+        return self._replace(path, (0,) + tuple(children[i] for i in order))
+
+    def rotate(self, path: tuple[int, ...],
+               direction: int) -> PersistentBoard | None:
+        """Return this board with the block at <path> rotated in <direction>,
+        or None if that block has no children.
+
+        Preconditions:
+        - direction in (ROT_CW, ROT_CCW)
+        """
+        node = self.node(path)
+        if isinstance(node, int):
+            return None
+        if direction not in (ROT_CW, ROT_CCW):
+            return self
+        return self._replace(path, _rotated(node, direction))
+
+    def paint(self, path: tuple[int, ...],
+              colour: tuple[int, int, int]) -> PersistentBoard | None:
+        """Return this board with the block at <path> painted <colour>, or None
+        if Block.paint would not change that block.
+        """
+        new_colour = COLOUR_LIST.index(colour)
+        if len(path) != self.max_depth or self.node(path) == new_colour:
+            return None
+        return self._replace(path, new_colour)
+
+    def combine(self, path: tuple[int, ...]) -> PersistentBoard | None:
+        """Return this board with the block at <path> combined into a leaf of
+        its children's majority colour, or None if Block.combine would not
+        combine that block.
+        """
+        node = self.node(path)
+        if isinstance(node, int) \
+                or not all(isinstance(child, int) for child in node[1:]):
+            return None
+        colour = majority(node[1:])
+        if colour is None:
+            return None
+        return self._replace(path, colour)
+
+    def apply(self, path: tuple[int, ...], action: Any,
+              info: dict[str, tuple[int, int, int]]) -> PersistentBoard | None:
+        """Return this board with <action> applied to the block at <path>, or
+        None if the action could not be performed.
+
+        <action> is an actions.Action, and <info> is the information passed to
+        its apply method.
+        """
+        move = _Move(self, path)
+        if action.apply(move, info) and move.result is not None:
+            return move.result
+        return None
+
+    def _replace(self, path: tuple[int, ...],
+                 new_node: Node) -> PersistentBoard:
+        """Return this board with the node at <path> replaced by <new_node>.
+
+        Only the nodes along <path> are rebuilt.
+        """
+        return PersistentBoard(_replace(self.root, path, 0, new_node),
+                               self.max_depth, self.size)
+
+
+def _replace(node: Node, path: tuple[int, ...], depth: int,
+             new_node: Node) -> Node:
+    """Return <node> with its descendant at path[depth:] replaced by
+    <new_node>.
+    """
+    if depth == len(path):
+        return new_node
+    children = list(_children(node))
+    index = path[depth]
+    children[index] = _replace(children[index], path, depth + 1, new_node)
+    return (0,) + tuple(children)
+
+
+class PersistentBlock:
+    """A read-only view of one block of a PersistentBoard.
+
+    A PersistentBlock has the attributes of a Block, so code that only reads
+    a board, such as goal.flatten, player._get_block and the goals' score
+    methods, can be given one.
+
+    Attributes
+    - node: The node of the board this view shows.
+    - path: The child indexes leading from the root to this block.
+    - position: The (x, y) coordinates of the upper left corner of this block.
+    - size: The height and width of this block.
+    - level: The level of this block.
+    - max_depth: The deepest level allowed in this block's board.
+    """
+    __slots__ = ('node', 'path', 'position', 'size', 'level', 'max_depth')
+    node: Node
+    path: tuple[int, ...]
+    position: tuple[int, int]
+    size: int
+    level: int
+    max_depth: int
+
+    def __init__(self, node: Node, path: tuple[int, ...],
+                 position: tuple[int, int], size: int, level: int,
+                 max_depth: int) -> None:
+        """Initialize a view of <node>, which is found at <path>.
+        """
+        self.node = node
+        self.path = path
+        self.position = position
+        self.size = size
+        self.level = level
+        self.max_depth = max_depth
+
+    @property
+    def colour(self) -> tuple[int, int, int] | None:
+        """The colour of this block, or None if it has children.
+        """
+        return COLOUR_LIST[self.node] if isinstance(self.node, int) else None
+
+    @property
+    def children(self) -> list[PersistentBlock]:
+        """Views of the four children of this block, in the same order as
+        Block.children, or an empty list if this block is a leaf.
+        """
+        if isinstance(self.node, int):
+            return []
+        size = round(self.size / 2.0)
+        x, y = self.position
+        positions = [(x + size, y), (x, y), (x, y + size),
+                     (x + size, y + size)]
+        return [PersistentBlock(child, self.path + (i,), positions[i], size,
+                                self.level + 1, self.max_depth)
+                for i, child in enumerate(_children(self.node))]
+
+    def __eq__(self, other: Block | PersistentBlock) -> bool:
+        """Return True iff this block and all its descendents are equivalent
+        to <other> and all its descendents.
+        """
+        if not self.children and not other.children:
+            return (self.position == other.position
+                    and self.size == other.size
+                    and self.colour == other.colour
+                    and self.level == other.level
+                    and self.max_depth == other.max_depth)
+        elif len(self.children) != len(other.children):
+            return False
+        else:
+            return self.children == other.children
+
+
+class _Move:
+    """A stand-in for a Block that an Action can be applied to.
+
+    Each action method performs the action on <board> at <path> and records
+    the resulting board in <result>.
+    """
+    __slots__ = ('board', 'path', 'result')
+    board: PersistentBoard
+    path: tuple[int, ...]
+    result: PersistentBoard | None
+
+    def __init__(self, board: PersistentBoard,
+                 path: tuple[int, ...]) -> None:
+        """Initialize a stand-in for the block at <path> on <board>.
+        """
+        self.board = board
+        self.path = path
+        self.result = None
+
+    def _record(self, result: PersistentBoard | None) -> bool:
+        """Record <result> and return True iff the action was performed.
+        """
+        self.result = result
+        return result is not None
+
+    def smash(self) -> bool:
+        """Smash the block, as PersistentBoard.smash does, and return True
+        iff it was smashed.
+        """
+        return self._record(self.board.smash(self.path))
+
+    def swap(self, direction: int) -> bool:
+        """Swap the children of the block, as PersistentBoard.swap does,
+        and return True iff they were swapped.
+        """
+        return self._record(self.board.swap(self.path, direction))
+
+    def rotate(self, direction: int) -> bool:
+        """Rotate the block, as PersistentBoard.rotate does, and return
+        True iff it was rotated.
+        """
+        return self._record(self.board.rotate(self.path, direction))
+
+    def paint(self, colour: tuple[int, int, int]) -> bool:
+        """Paint the block <colour>, as PersistentBoard.paint does, and
+        return True iff it was painted.
+        """
+        return self._record(self.board.paint(self.path, colour))
+
+    def combine(self) -> bool:
+        """Combine the block, as PersistentBoard.combine does, and return
+        True iff it was combined.
+        """
+        return self._record(self.board.combine(self.path))
+
+
+if __name__ == '__main__':
+    import python_ta
+
+    python_ta.check_all(config={
+        'allowed-import-modules': [
+            'doctest', 'python_ta', 'random', 'typing', '__future__', 'math',
+            'block', 'settings'
+        ],
+        'max-attributes': 15,
+        'max-args': 6
+    })
+
+    import doctest
+
+    doctest.testmod()
@@ -22,16 +22,36 @@ Module Description:
 This file contains the hierarchy of player classes.
 """
 from __future__ import annotations
+from concurrent.futures import Executor, Future, ThreadPoolExecutor
+from threading import Event
+from types import ModuleType
+from typing import TYPE_CHECKING, Any, Iterable, Iterator
+import os
 import random
-import pygame
+import time
 
-from block import Block
+from block import Block, Journal, ROT_CW
 from goal import Goal, generate_goals
+from instrument import annotate, hot, span
+from persistent import PersistentBoard
 
 from actions import Action, KEY_ACTION, ROTATE_CLOCKWISE, \
     ROTATE_COUNTER_CLOCKWISE, \
     SWAP_HORIZONTAL, SWAP_VERTICAL, SMASH, PASS, PAINT, COMBINE
 
+if TYPE_CHECKING:
+    import pygame
+
+
+def _pygame() -> ModuleType:
+    """Return the pygame module, importing it the first time it is needed.
+
+    Only HumanPlayer and event handling use pygame, so computer players can
+    be created and asked for moves without it ever being imported.
+    """
+    import pygame  # pylint: disable=import-outside-toplevel
+    return pygame
+
 
 def create_players(num_human: int, num_random: int, smart_players: list[int]) \
         -> list[Player]:
@@ -66,6 +86,7 @@ def create_players(num_human: int, num_random: int, smart_players: list[int]) \
     return player_list
 
 
+@hot
 def _get_block(block: Block, location: tuple[int, int], level: int) -> \
         Block | None:
     """Return the Block within <block> that is at <level> and includes
@@ -84,25 +105,306 @@ def _get_block(block: Block, location: tuple[int, int], level: int) -> \
     Preconditions:
         - block.level <= level <= block.max_depth
     """
-    is_target_level = block.level == level
-    is_leaf_and_deeper = not block.children and level > block.level
-    in_x_range = block.position[0] <= location[0] \
-        < block.position[0] + block.size
-    in_y_range = block.position[1] <= location[1] \
-        < block.position[1] + block.size
-
-    if (is_target_level or is_leaf_and_deeper) and in_x_range and in_y_range:
-        return block
+    path = _get_path(block, location, level)
+    if path is None:
+        return None
+    return _resolve_path(block, path)
+
+
+# The index in Block.children of the child in each quadrant of a block,
+# indexed first by whether it is in the bottom half, then by whether it is in
+# the right half.
+_QUADRANT_CHILD = ((1, 0), (2, 3))
+
+
+def _get_path(block: Block, location: tuple[int, int], level: int) -> \
+        tuple[int, ...] | None:
+    """Return the indexes of the children leading from <block> to the Block
+    that _get_block(block, location, level) returns, or None if it returns
+    None.
+
+    The child containing <location> is worked out from which side of the
+    lines splitting a block in half <location> is on, so each level costs
+    the same no matter how many children are checked, and the positions of
+    the children are never read.
+
+    >>> board = Block((0, 0), 750, (0, 0, 0), 0, 2)
+    >>> board.smash()
+    True
+    >>> _get_path(board, (700, 10), 1), _get_path(board, (10, 10), 0)
+    ((0,), ())
+    >>> _get_path(board, (750, 10), 1) is None
+    True
+
+    Preconditions:
+        - block.level <= level <= block.max_depth
+    """
+    x, y = block.position
+    size = block.size
+    if not (x <= location[0] < x + size and y <= location[1] < y + size):
+        return None
+    path = []
+    depth = block.level
+    children = block.children
+    while depth < level and children:
+        half = round(size / 2.0)
+        right = location[0] >= x + half
+        bottom = location[1] >= y + half
+        x += half * right
+        y += half * bottom
+        size = half
+        # Rounding can leave the children short of the bottom or right edge.
+        if location[0] >= x + size or location[1] >= y + size:
+            return None
+        index = _QUADRANT_CHILD[bottom][right]
+        path.append(index)
+        children = children[index].children
+        depth += 1
+    return tuple(path)
+
+
+def _resolve_path(board: Block, path: tuple[int, ...]) -> Block:
+    """Return the Block reached from <board> by following <path>, the indexes
+    of the children leading to it.
+
+    A path found on one board can be followed on any board with the same
+    structure, such as a copy.
+
+    Preconditions:
+        - <path> leads to a Block within <board>
+    """
+    for index in path:
+        board = board.children[index]
+    return board
+
+
+def generate_moves(board: Block, colour: tuple[int, int, int]) -> \
+        Iterator[tuple[Action, Block]]:
+    """Yield every distinct valid move on <board> for a player whose goal
+    has the target <colour>, as (action, block) pairs.
+
+    Each Block of <board> is visited once, parents before their children,
+    and only the actions that would change it are yielded:
+    - SMASH for a leaf above max_depth;
+    - PAINT for a leaf at max_depth that is not already <colour>;
+    - ROTATE_CLOCKWISE unless the Block looks the same once rotated, and
+      ROTATE_COUNTER_CLOCKWISE unless that rotation would also give the same
+      board as the clockwise one;
+    - SWAP_HORIZONTAL and SWAP_VERTICAL unless the children that trade
+      places are the same;
+    - COMBINE if the children are leaves with a majority colour.
+    PASS is never yielded.
+
+    Moves are found lazily, so <board> must not be changed until the moves
+    wanted have been taken. Equal Blocks are found by comparing their
+    zobrist hashes.
+
+    >>> board = Block((0, 0), 750, (0, 0, 0), 0, 1)
+    >>> [action.name for action, _ in generate_moves(board, (0, 0, 0))]
+    ['smash']
+    """
+    stack = [board]
+    while stack:
+        block = stack.pop()
+        yield from _block_moves(block, colour)
+        stack.extend(reversed(block.children))
 
-    for child in block.children:
-        in_child_x_range = child.position[0] <= location[0] \
-            < child.position[0] + child.size
-        in_child_y_range = child.position[1] <= location[1] \
-            < child.position[1] + child.size
-        if in_child_x_range and in_child_y_range:
-            return _get_block(child, location, level)
 
-    return None
+def _block_moves(block: Block, colour: tuple[int, int, int]) -> \
+        list[tuple[Action, Block]]:
+    """Return the moves generate_moves yields for <block> itself, in the
+    same order.
+    """
+    children = block.children
+    if not children:
+        moves = []
+        if block.can_smash():
+            moves.append((SMASH, block))
+        if block.can_paint(colour):
+            moves.append((PAINT, block))
+        return moves
+    moves = []
+    if not block.is_symmetric(ROT_CW):
+        moves.append((ROTATE_CLOCKWISE, block))
+        if not block.is_symmetric(2):
+            moves.append((ROTATE_COUNTER_CLOCKWISE, block))
+    hashes = [child.zobrist_hash() for child in children]
+    if hashes[0] != hashes[1] or hashes[2] != hashes[3]:
+        moves.append((SWAP_HORIZONTAL, block))
+    if hashes[0] != hashes[3] or hashes[1] != hashes[2]:
+        moves.append((SWAP_VERTICAL, block))
+    if block.can_combine():
+        moves.append((COMBINE, block))
+    return moves
+
+
+def _shuffled_moves(board: Block, colour: tuple[int, int, int],
+                    rng: random.Random) -> Iterator[tuple[Action, Block]]:
+    """Yield the moves generate_moves yields, in a random order drawn from
+    <rng>.
+
+    Moves are found lazily, a Block at a time, so taking the first few moves
+    costs little however large <board> is. Each Block is found by walking
+    down from the root, through children drawn at random, to a Block whose
+    children have all been visited, and its moves are yielded in a random
+    order. The walk goes through children that have children of their own
+    when it can. So the first moves are spread across the board, but are on
+    small Blocks, deep in the tree, whose moves change few cells and are
+    usually the quickest to score; moves on large leaves come later, and the
+    moves near the root, which change the whole board, come last.
+
+    As with generate_moves, <board> must not be changed until the moves
+    wanted have been taken, except by changes that are rolled back with a
+    Journal.
+    """
+    # The children of each Block walked through that have not been visited,
+    # as those with children and those without.
+    unvisited = {}
+    path = []
+    block = board
+    while True:
+        if id(block) not in unvisited:
+            children = block.children
+            unvisited[id(block)] = ([child for child in children
+                                     if child.children],
+                                    [child for child in children
+                                     if not child.children])
+        inner, leaves = unvisited[id(block)]
+        children = inner or leaves
+        if children:
+            index = rng.randrange(len(children))
+            path.append((children, index))
+            block = children[index]
+            continue
+        moves = _block_moves(block, colour)
+        rng.shuffle(moves)
+        yield from moves
+        del unvisited[id(block)]
+        if not path:
+            return
+        children, index = path.pop()
+        children[index] = children[-1]
+        children.pop()
+        path.clear()
+        block = board
+
+
+# The actions a computer player can choose from, apart from PASS.
+_MOVE_ACTIONS = (ROTATE_CLOCKWISE, ROTATE_COUNTER_CLOCKWISE, SWAP_HORIZONTAL,
+                 SWAP_VERTICAL, SMASH, PAINT, COMBINE)
+
+
+def _is_valid(action: Action, block: Block,
+              colour: tuple[int, int, int]) -> bool:
+    """Return True iff applying <action> to <block>, for a player whose goal
+    has the target <colour>, would succeed.
+
+    Nothing is applied, so this neither changes nor copies the board.
+    """
+    if action in (ROTATE_CLOCKWISE, ROTATE_COUNTER_CLOCKWISE):
+        return block.can_rotate()
+    if action in (SWAP_HORIZONTAL, SWAP_VERTICAL):
+        return block.can_swap()
+    if action == SMASH:
+        return block.can_smash()
+    if action == PAINT:
+        return block.can_paint(colour)
+    if action == COMBINE:
+        return block.can_combine()
+    return action == PASS
+
+
+# A move to score: its number among the moves being scored, the index of its
+# action in _MOVE_ACTIONS, and the path to the block it is applied to.
+ScoredMove = tuple[int, int, tuple[int, ...]]
+
+
+def _number_moves(candidates: Iterable[tuple[Action, Block]],
+                  taken: list[tuple[Action, Block]]) -> Iterator[ScoredMove]:
+    """Yield each move in <candidates> as a ScoredMove, numbered in order,
+    appending it to <taken> as it is yielded.
+
+    Paths are found as the moves are taken, so no time is spent on moves
+    that are never tried.
+    """
+    for number, (action, block) in enumerate(candidates):
+        taken.append((action, block))
+        yield number, _MOVE_ACTIONS.index(action), block.path()
+
+
+def _before(deadline: float, moves: Iterator[ScoredMove]) -> \
+        Iterator[ScoredMove]:
+    """Yield the moves in <moves> until time.perf_counter() reaches
+    <deadline>.
+
+    The time is checked each time another move is asked for, before it is
+    taken from <moves>, so no move is taken once the deadline has passed.
+    """
+    while time.perf_counter() < deadline:
+        move = next(moves, None)
+        if move is None:
+            return
+        yield move
+
+
+@hot
+def _score_moves(board: Block, goal: Goal, moves: Iterable[ScoredMove],
+                 seed: int, stop: Event) -> list[tuple[int, int]]:
+    """Return the (number, score) of each move in <moves>, where the score is
+    <goal>'s score on <board> after the move, less the move's penalty.
+
+    Each move is tried out on <board> and rolled back. Before move number k
+    is tried, a random.Random of its own is seeded with <seed> + k, and a
+    smash draws from it, so a smash gives the same result whichever process
+    or thread tries it, and in whatever order. The random module is not
+    used, so this can run in any thread.
+
+    No more moves are tried once <stop> is set. <moves> may be a generator,
+    which is only asked for another move once the last one was scored and
+    rolled back, so a generator from _before stops the moves being tried
+    once its deadline passes.
+    """
+    rng = random.Random()
+    info = {"colour": goal.colour}
+    journal = Journal(board)
+    scores = []
+    try:
+        for number, action_index, path in moves:
+            if stop.is_set():
+                break
+            action = _MOVE_ACTIONS[action_index]
+            rng.seed(seed + number)
+            _apply(action, _resolve_path(board, path), info, rng)
+            scores.append((number, goal.score(board) - action.penalty))
+            journal.rollback()
+    finally:
+        journal.rollback()
+        journal.close()
+    return scores
+
+
+def _apply(action: Action, block: Block,
+           info: dict[str, tuple[int, int, int]], rng: random.Random) -> bool:
+    """Apply <action> to <block>, with <info>, as action.apply does, and
+    return True iff it was performed.
+
+    A smash draws its random numbers from <rng> instead of from the random
+    module.
+    """
+    if action == SMASH:
+        return block.smash(rng)
+    return action.apply(block, info)
+
+
+def _score_shard(board: PersistentBoard, goal: Goal, moves: list[ScoredMove],
+                 seed: int) -> list[tuple[int, int]]:
+    """Return _score_moves for <moves> on <board>.
+
+    This runs in a worker process: the board is sent as a PersistentBoard,
+    whose nested tuples pickle far smaller than a tree of Blocks, and is
+    rebuilt once for all of <moves>.
+    """
+    return _score_moves(board.to_block(), goal, moves, seed, Event())
 
 
 class Player:
@@ -180,7 +482,7 @@ class HumanPlayer(Player):
 
         If no block is selected by the player, return None.
         """
-        mouse_pos = pygame.mouse.get_pos()
+        mouse_pos = _pygame().mouse.get_pos()
         block = _get_block(board, mouse_pos, self._level)
 
         return block
@@ -190,6 +492,7 @@ class HumanPlayer(Player):
         the mapping in KEY_ACTION, as well as the W and S keys for changing
         the level.
         """
+        pygame = _pygame()  # pylint: disable=redefined-outer-name
         if event.type == pygame.KEYUP:
             if event.key in KEY_ACTION:
                 self._desired_action = KEY_ACTION[event.key]
@@ -228,65 +531,309 @@ class HumanPlayer(Player):
         self._level = max(0, min(self._level, board.max_depth))
 
 
+class SearchOptions:
+    """How a computer player searches for its moves.
+
+    Instance Attributes:
+    - background: True iff moves are chosen in the background (see
+                  ComputerPlayer).
+    - executor: The pool of worker processes moves are assessed in, usually
+                a ProcessPoolExecutor, or None if they are assessed in the
+                player's own process. The caller owns it and shuts it down.
+    - shards: The number of groups the moves are split into, one task per
+              group, when they are assessed by <executor>, or None for one
+              group per CPU. It is not used without <executor>.
+    - time_budget_ms: The number of milliseconds choosing a move may take,
+                      or None if the search takes as long as it takes.
+
+    A search with a time budget assesses its moves one at a time, in the
+    player's own process, so an executor cannot be used with a time budget:
+
+    >>> SearchOptions(executor=ThreadPoolExecutor(), time_budget_ms=20)
+    Traceback (most recent call last):
+    ...
+    ValueError: an executor cannot be used with a time budget
+
+    Representation Invariants:
+    - self.executor is None or self.time_budget_ms is None
+    - self.shards is None or self.shards >= 1
+    - self.time_budget_ms is None or self.time_budget_ms > 0
+    """
+    background: bool
+    executor: Executor | None
+    shards: int | None
+    time_budget_ms: int | None
+
+    def __init__(self, background: bool = False,
+                 executor: Executor | None = None, shards: int | None = None,
+                 time_budget_ms: int | None = None) -> None:
+        """Initialize these options with the given attributes.
+
+        Raise ValueError if both <executor> and <time_budget_ms> are given.
+
+        Preconditions:
+        - shards is None or shards >= 1
+        - time_budget_ms is None or time_budget_ms > 0
+        """
+        if executor is not None and time_budget_ms is not None:
+            raise ValueError('an executor cannot be used with a time budget')
+        self.background = background
+        self.executor = executor
+        self.shards = shards
+        self.time_budget_ms = time_budget_ms
+
+
 class ComputerPlayer(Player):
     """A computer player. This class is still abstract,
     as how it generates moves is still to be defined
     in a subclass.
 
+    A computer player can choose its moves in the background: once it is
+    told to proceed, the first call to generate_move starts choosing a move
+    in a thread of its own, and returns None. Later calls return None until
+    the move has been chosen, so the game can keep drawing the board and
+    handling events in the meantime. The move is chosen on a copy of the
+    board, made in that thread, so the game's thread only ever spends time
+    proportional to reading the board once.
+
+    The game polls generate_move until it returns a move, which is on the
+    board it was asked about, and cancel stops a search under way:
+
+    >>> from block import generate_board
+    >>> from goal import BlobGoal
+    >>> from settings import COLOUR_LIST
+    >>> random.seed(1)
+    >>> board = generate_board(3, 750)
+    >>> player = SmartPlayer(0, BlobGoal(COLOUR_LIST[0]), 10,
+    ...                      SearchOptions(background=True))
+    >>> player.proceed()
+    >>> move = player.generate_move(board)
+    >>> move is None
+    True
+    >>> while move is None:
+    ...     time.sleep(0.001)
+    ...     move = player.generate_move(board)
+    >>> _, block = move
+    >>> while block.parent is not None:
+    ...     block = block.parent
+    >>> block is board
+    True
+    >>> player.proceed()
+    >>> player.generate_move(board) is None
+    True
+    >>> player.cancel()
+    >>> player.generate_move(board) is None
+    True
+    >>> board.find_observer(_ChangeWatch) is None
+    True
+
+    A move is chosen with a random.Random of its own, seeded from the random
+    module when the move is asked for, so the move depends only on the state
+    of random at that time, and choosing it never changes or reads the state
+    of random, in whatever thread it is chosen.
+
+    How a computer player searches is set by the SearchOptions it is given.
+
     Instance Attributes:
     - _proceed: True when the player should make a move, False when the
                 player should wait.
+    - _background: True iff moves are chosen in the background.
+    - _worker: The thread a move is being chosen in, or None if no move is
+               being chosen in the background.
+    - _search: The board a move is being chosen for in the background, the
+               observer that notices if that board changes, the future of
+               the move, and the event that stops the search, or None if no
+               move is being chosen.
     """
     _proceed: bool
+    _background: bool
+    _worker: ThreadPoolExecutor | None
+    _search: tuple[Block, _ChangeWatch, Future, Event] | None
 
-    def __init__(self, player_id: int, goal: Goal) -> None:
+    def __init__(self, player_id: int, goal: Goal,
+                 options: SearchOptions | None = None) -> None:
         Player.__init__(self, player_id, goal)
 
         self._proceed = False
+        self._background = options is not None and options.background
+        self._worker = None
+        self._search = None
 
     def get_selected_block(self, board: Block) -> Block | None:
         return None
 
     def process_event(self, event: pygame.event.Event) -> None:
+        pygame = _pygame()  # pylint: disable=redefined-outer-name
         if (event.type == pygame.MOUSEBUTTONDOWN
                 and event.button == pygame.BUTTON_LEFT):
             self._proceed = True
 
+    def proceed(self) -> None:
+        """Tell this player to make a move, as a left click would.
+
+        This lets games be played without a display.
+        """
+        self._proceed = True
+
     def generate_move(self, board: Block) -> \
             tuple[Action, Block] | None:
+        """Return the move this player chooses to make on <board>, or None if
+        it has not been told to proceed or, in the background, has not
+        finished choosing.
+
+        A move chosen in the background is returned as the same move on
+        <board>, found by its path. If an action is performed on <board>
+        while the move is being chosen, the move is thrown away and a new
+        search is started.
+        """
+        if not self._background:
+            if not self._proceed:
+                return None
+            self._proceed = False
+            return self._choose_move_in_span(board, Event(), _search_rng())
+        if self._search is None:
+            if self._proceed:
+                self._proceed = False
+                self._start_search(board)
+            return None
+        _, watch, future, _ = self._search
+        if not future.done():
+            return None
+        self._end_search()
+        if watch.changed:
+            self._start_search(board)
+            return None
+        move = future.result()
+        if move is None:
+            return None
+        action, block = move
+        return action, _resolve_path(board, block.path())
+
+    def cancel(self) -> None:
+        """Stop choosing a move in the background, if a move is being chosen.
+
+        This player then waits to be told to proceed again.
+        """
+        if self._search is not None:
+            _, _, future, stop = self._search
+            stop.set()
+            future.cancel()
+            self._end_search()
+
+    def _start_search(self, board: Block) -> None:
+        """Start choosing a move for <board> in the background.
+
+        Every rotation still pending in <board> is applied first, so that
+        reading <board> no longer changes it, and the game's thread can keep
+        drawing it while it is copied in the background.
+        """
+        _settle(board)
+        watch = _ChangeWatch()
+        board.add_observer(watch)
+        stop = Event()
+        self._worker = ThreadPoolExecutor(max_workers=1)
+        future = self._worker.submit(self._choose_move_on_copy, board, stop,
+                                     _search_rng())
+        self._search = (board, watch, future, stop)
+
+    def _end_search(self) -> None:
+        """Stop watching the board of the search in the background, and shut
+        down the thread it runs in once it has ended.
+        """
+        board, watch, _, _ = self._search
+        board.remove_observer(watch)
+        self._worker.shutdown(wait=False)
+        self._worker = None
+        self._search = None
+
+    def _choose_move_on_copy(self, board: Block, stop: Event,
+                             rng: random.Random) -> \
+            tuple[Action, Block] | None:
+        """Return self._choose_move_in_span(copy, stop, rng), where <copy> is
+        a copy of <board> made in the calling thread.
+        """
+        return self._choose_move_in_span(board.create_copy(), stop, rng)
+
+    def _choose_move_in_span(self, board: Block, stop: Event,
+                             rng: random.Random) -> \
+            tuple[Action, Block] | None:
+        """Return self._choose_move(board, stop, rng), recorded as an
+        instrument span named after this player's class, if instrumentation
+        is enabled.
+        """
+        with span(f'{type(self).__name__}.generate_move', player=self.id):
+            return self._choose_move(board, stop, rng)
+
+    def _choose_move(self, board: Block, stop: Event,
+                     rng: random.Random) -> tuple[Action, Block] | None:
+        """Return the move this player chooses to make on <board>, or None if
+        it cannot find one, drawing any random numbers it needs from <rng>.
+
+        <stop> is set once the move is no longer wanted, and the search may
+        then end early with any move.
+        """
         raise NotImplementedError
 
 
+def _search_rng() -> random.Random:
+    """Return a new random.Random for choosing one move, seeded from the
+    random module.
+    """
+    return random.Random(random.getrandbits(32))
+
+
+def _settle(board: Block) -> None:
+    """Apply every rotation still pending in <board>, by reading every
+    Block in it.
+    """
+    stack = [board]
+    while stack:
+        stack.extend(stack.pop().children)
+
+
+class _ChangeWatch:
+    """An observer of a board that notices whether an action is performed
+    on it (see Block.add_observer).
+
+    Instance Attributes:
+    - changed: True iff an action has been performed on the board since
+               this observer was added to it.
+    """
+    changed: bool
+
+    def __init__(self) -> None:
+        """Initialize an observer that has seen no action.
+        """
+        self.changed = False
+
+    def block_changed(self, block: Block, action: str, undo: Any) -> None:
+        """Record that an action was performed.
+        """
+        self.changed = True
+
+
 class RandomPlayer(ComputerPlayer):
     """A computer player who chooses completely random moves."""
 
-    def generate_move(self, board: Block) -> \
-            tuple[Action, Block] | None:
+    def _choose_move(self, board: Block, stop: Event,
+                     rng: random.Random) -> tuple[Action, Block] | None:
         """Return a valid, randomly generated move.
 
         A valid move is a move other than PASS that can be successfully
         performed on the <board>.
 
-        This function does not mutate <board>.
+        This function does not mutate <board>, and does not try out any
+        move: whether a move is valid is checked with the Block's can_
+        methods.
         """
-        if not self._proceed:
-            return None
-        actions = [ROTATE_CLOCKWISE, ROTATE_COUNTER_CLOCKWISE,
-                   SWAP_HORIZONTAL, SWAP_VERTICAL, SMASH, PAINT, COMBINE]
-        random.shuffle(actions)
         for _ in range(40):
-            action: Action = actions[random.randint(0, 6)]
-            level = random.randint(0, board.max_depth)
-            position = random.randint(
-                0, board.size - 1), random.randint(0, board.size - 1)
-            board_copy = board.create_copy()
-            block_copy = _get_block(board_copy, position, level)
-            if block_copy and action.apply(block_copy,
-                                           {"colour": self.goal.colour}):
-                original_block = _get_block(board, position, level)
-                self._proceed = False
-                return action, original_block
-        self._proceed = False
+            action = rng.choice(_MOVE_ACTIONS)
+            level = rng.randint(0, board.max_depth)
+            position = rng.randint(
+                0, board.size - 1), rng.randint(0, board.size - 1)
+            block = _get_block(board, position, level)
+            if block and _is_valid(action, block, self.goal.colour):
+                return action, block
         return None
 
 
@@ -294,13 +841,29 @@ class SmartPlayer(ComputerPlayer):
     """A computer player who chooses moves by assessing a series of random
     moves and choosing the one that yields the best score.
 
+    Instance Attributes:
+    - evaluated: The number of moves assessed by the last call to
+                 generate_move.
+
     Private Instance Attributes:
     - _num_test: The number of moves this SmartPlayer will test out before
                  choosing a move.
+    - _executor: The pool of worker processes moves are assessed in, or None
+                 if they are assessed in this process.
+    - _shards: The number of groups the moves are split into, one task per
+               group, when they are assessed by <_executor>.
+    - _time_budget_ms: The number of milliseconds generate_move may take, or
+                       None if it assesses <_num_test> moves however long
+                       that takes.
     """
+    evaluated: int
     _num_test: int
+    _executor: Executor | None
+    _shards: int
+    _time_budget_ms: int | None
 
-    def __init__(self, player_id: int, goal: Goal, difficulty: int) -> None:
+    def __init__(self, player_id: int, goal: Goal, difficulty: int,
+                 options: SearchOptions | None = None) -> None:
         """Initialize this SmartPlayer with a <player_id> and <goal>.
 
         Use <difficulty> to determine and record how many moves this SmartPlayer
@@ -308,14 +871,27 @@ class SmartPlayer(ComputerPlayer):
         <difficulty>, the more moves this SmartPlayer will assess, and hence the
         more difficult an opponent this SmartPlayer will be.
 
+        If <options> has an executor, moves are assessed in its worker
+        processes, split into its number of shards.
+
+        If <options> has a time budget, <difficulty> is not used. Instead,
+        moves are assessed in this process, in a random order, until the
+        budget has run out or every move has been assessed.
+
         Preconditions:
         - difficulty >= 0
         """
-        ComputerPlayer.__init__(self, player_id, goal)
+        ComputerPlayer.__init__(self, player_id, goal, options)
+        if options is None:
+            options = SearchOptions()
+        self.evaluated = 0
         self._num_test = difficulty
+        self._executor = options.executor
+        self._shards = options.shards or os.cpu_count() or 1
+        self._time_budget_ms = options.time_budget_ms
 
-    def generate_move(self, board: Block) -> \
-            tuple[Action, Block] | None:
+    def _choose_move(self, board: Block, stop: Event,
+                     rng: random.Random) -> tuple[Action, Block] | None:
         """Return a valid move by assessing multiple valid moves and choosing
         the move that results in the highest score for this player's goal (i.e.,
         disregarding penalties).
@@ -324,38 +900,198 @@ class SmartPlayer(ComputerPlayer):
         performed on the <board>. If no move can be found that is better than
         the current score, this player will pass.
 
-        This function does not mutate <board>.
+        This function does not mutate <board>. Each move is tried out on
+        <board> itself, or on a copy in a worker process, scored, and rolled
+        back with a Journal.
+
+        The moves assessed are drawn from generate_moves, so no two of them
+        are the same and none of them leaves the board unchanged. If there
+        are no more of them than this player's number of tests, every one is
+        assessed. The move chosen depends only on the state of <rng> when
+        this is called, and not on whether or how the moves are split between
+        processes.
+
+        With a time budget, moves are found lazily, in a random order, and
+        assessed until the budget runs out, counted from when this is called,
+        and the best move found so far is chosen. The budget includes scoring
+        <board> as it is, and this player passes if that alone uses it up.
+        Only a move already being scored when the budget runs out can take
+        this past it. The number of moves assessed is recorded in <evaluated>
+        either way.
         """
-        if not self._proceed:
-            return None
+        deadline = None
+        if self._time_budget_ms is not None:
+            deadline = time.perf_counter() + self._time_budget_ms / 1000
         current_score = self.goal.score(board)
-        best_score = -1
-        best_move = None
-        actions = [ROTATE_CLOCKWISE, ROTATE_COUNTER_CLOCKWISE,
-                   SWAP_HORIZONTAL, SWAP_VERTICAL, SMASH, PAINT, COMBINE]
-
-        for _ in range(self._num_test):
-            action: Action = random.choice(actions)
-            level = random.randint(0, board.max_depth)
-            position = (random.randint(0, board.size - 1),
-                        random.randint(0, board.size - 1))
-            board_copy = board.create_copy()
-            block_copy = _get_block(board_copy, position, level)
-            if block_copy and action.apply(block_copy,
-                                           {"colour": self.goal.colour}):
-                score_after_move = self.goal.score(board_copy) - action.penalty
-                if score_after_move > best_score:
-                    original_block = _get_block(board, position, level)
-                    best_score = score_after_move
-                    best_move = (action, original_block)
+        if deadline is not None and time.perf_counter() >= deadline:
+            self.evaluated = 0
+            annotate(evaluated=0)
+            return (PASS, board)
+        if deadline is not None:
+            candidates = _shuffled_moves(board, self.goal.colour, rng)
+        else:
+            candidates = list(generate_moves(board, self.goal.colour))
+            if len(candidates) > self._num_test:
+                candidates = rng.sample(candidates, self._num_test)
+        taken = []
+        moves = _number_moves(candidates, taken)
+        seed = rng.getrandbits(32)
+
+        if deadline is not None:
+            scores = _score_moves(board, self.goal, _before(deadline, moves),
+                                  seed, stop)
+        elif self._executor is None or len(candidates) < 2:
+            scores = _score_moves(board, self.goal, moves, seed, stop)
+        else:
+            moves = list(moves)
+            persistent = PersistentBoard.from_block(board)
+            futures = [self._executor.submit(
+                _score_shard, persistent, self.goal,
+                moves[shard::self._shards], seed)
+                for shard in range(min(self._shards, len(moves)))]
+            scores = [score for future in futures for score in future.result()]
+        annotate(candidates=len(taken))
+        self.evaluated = len(scores)
+        annotate(evaluated=self.evaluated)
+
+        # Of the moves with the best score, choose the one found first.
+        best = max(scores, key=lambda item: (item[1], -item[0]), default=None)
+        if best is not None and best[1] > current_score:
+            # Reach the block from the root again, which brings its position
+            # up to date after the moves that were rolled back.
+            action, block = taken[best[0]]
+            return action, _resolve_path(board, block.path())
+        else:
+            return (PASS, board)
 
-        self._proceed = False
-        if best_move and best_score > current_score:
-            return best_move
+
+class SearchPlayer(ComputerPlayer):
+    """A computer player who looks several of its own moves ahead, with a
+    beam search, and makes the first move of the best line of play found.
+
+    The opponents' moves are not considered.
+
+    Private Instance Attributes:
+    - _depth: The number of this player's moves each line of play has, at
+              most.
+    - _beam_width: The number of lines of play kept after each move.
+    - _branching: The number of moves tried at each step of the search,
+                  shared between the lines of play being extended.
+    """
+    _depth: int
+    _beam_width: int
+    _branching: int
+
+    def __init__(self, player_id: int, goal: Goal,
+                 beam: tuple[int, int, int] = (2, 2, 100),
+                 options: SearchOptions | None = None) -> None:
+        """Initialize this SearchPlayer with a <player_id> and <goal>.
+
+        <beam> is the (depth, beam_width, branching) of the search. Each
+        turn, this player searches lines of play up to depth moves long.
+        After each move, only the beam_width best lines are followed further,
+        by trying branching moves in all, shared equally between them.
+
+        Lines of play are tried out in this process, and as many are tried
+        however long that takes, so raise ValueError if <options> has an
+        executor or a time budget.
+
+        Preconditions:
+        - all(n >= 1 for n in beam)
+        """
+        if options is not None and (options.executor is not None
+                                    or options.time_budget_ms is not None):
+            raise ValueError('a SearchPlayer takes no executor or time budget')
+        ComputerPlayer.__init__(self, player_id, goal, options)
+        self._depth, self._beam_width, self._branching = beam
+
+    def _choose_move(self, board: Block, stop: Event,
+                     rng: random.Random) -> tuple[Action, Block] | None:
+        """Return the first move of the best line of play found for this
+        player's goal, or PASS if no line of play ends with a higher score,
+        less its penalties, than the current score.
+
+        This function does not mutate <board>. Lines of play are tried out
+        on <board> itself and rolled back with a Journal.
+
+        A line is scored once, when it is first reached, and the lines kept
+        after one move are extended by the next without being scored again.
+        Moves are ordered by the score they lead to, so the best lines are
+        the ones kept. A line that reaches a board already reached by
+        another line is dropped, and a line ending in a smash is not
+        extended, since what the smash makes is random.
+        """
+        current_score = self.goal.score(board)
+        seed = rng.getrandbits(32)
+        smasher = random.Random()
+        info = {"colour": self.goal.colour}
+        journal = Journal(board)
+        seen = {board.zobrist_hash()}
+        # Each line of play is its moves, as ScoredMoves, and their total
+        # penalty.
+        beam = [((), 0)]
+        best = None
+        number = 0
+        try:
+            for _ in range(self._depth):
+                lines = []
+                for moves, penalty in beam:
+                    _replay(board, moves, seed, info, smasher)
+                    start = len(journal)
+                    candidates = list(generate_moves(board, self.goal.colour))
+                    tries = max(1, self._branching // len(beam))
+                    if len(candidates) > tries:
+                        candidates = rng.sample(candidates, tries)
+                    for action, block in candidates:
+                        if stop.is_set():
+                            break
+                        move = (number, _MOVE_ACTIONS.index(action),
+                                block.path())
+                        smasher.seed(seed + number)
+                        number += 1
+                        _apply(action, block, info, smasher)
+                        reached = board.zobrist_hash()
+                        if reached not in seen:
+                            seen.add(reached)
+                            total = penalty + action.penalty
+                            lines.append((self.goal.score(board) - total,
+                                          moves + (move,), total))
+                        journal.rollback(start)
+                    journal.rollback()
+                lines.sort(key=lambda line: line[0], reverse=True)
+                if lines and (best is None or lines[0][0] > best[0]):
+                    best = lines[0][0], lines[0][1][0]
+                beam = [(moves, penalty) for _, moves, penalty in lines
+                        if _MOVE_ACTIONS[moves[-1][1]] != SMASH]
+                beam = beam[:self._beam_width]
+        finally:
+            journal.rollback()
+            journal.close()
+        annotate(evaluated=number)
+
+        if best is not None and best[0] > current_score:
+            _, action_index, path = best[1]
+            return _MOVE_ACTIONS[action_index], _resolve_path(board, path)
         else:
             return (PASS, board)
 
 
+def _replay(board: Block, moves: tuple[ScoredMove, ...], seed: int,
+            info: dict[str, tuple[int, int, int]],
+            rng: random.Random) -> None:
+    """Apply <moves> to <board> in order, with <info> passed to each
+    action.
+
+    As in _score_moves, <rng> is seeded with <seed> + number before each
+    move, and a smash draws from it, so each smash has the same result
+    every time it is replayed.
+    """
+    for number, action_index, path in moves:
+        rng.seed(seed + number)
+        _apply(_MOVE_ACTIONS[action_index], _resolve_path(board, path), info,
+               rng)
+
+
 if __name__ == '__main__':
     import python_ta
 
@@ -363,7 +1099,8 @@ if __name__ == '__main__':
         'allowed-io': ['process_event'],
         'allowed-import-modules': [
             'doctest', 'python_ta', 'random', 'typing', 'actions', 'block',
-            'goal', 'pygame', '__future__'
+            'goal', 'pygame', '__future__', 'concurrent.futures', 'os',
+            'persistent', 'time', 'threading', 'types', 'instrument'
         ],
         'max-attributes': 10,
         'generated-members': 'pygame.*'
@@ -0,0 +1,429 @@
+"""CSC148 Assignment 2
+
+CSC148 Winter 2024
+Department of Computer Science,
+University of Toronto
+
+This code is provided solely for the personal and private use of
+students taking the CSC148 course at the University of Toronto.
+Copying for purposes other than this use is expressly prohibited.
+All forms of distribution of this code, whether as given or with
+any changes, are expressly prohibited.
+
+Authors: Diane Horton, David Liu, Mario Badr, Sophia Huynh, Misha Schwartz,
+Jaisie Sin, and Joonho Kim
+
+All of the files in this directory and all subdirectories are:
+Copyright (c) Diane Horton, David Liu, Mario Badr, Sophia Huynh,
+Misha Schwartz, Jaisie Sin, and Joonho Kim
+
+Module Description:
+
+This file contains an array-backed board engine. An ArrayBoard stores a
+whole quadtree as parallel arrays, and ArrayBlock exposes one node of it
+through the same interface as block.Block.
+"""
+from __future__ import annotations
+import random
+import math
+from array import array
+
+from block import Block, majority, to_block, ROT_CW, ROT_CCW, SWAP_HORZ, \
+    SWAP_VERT
+from settings import COLOUR_LIST
+
+# The colour index stored for nodes that have children.
+NO_COLOUR = 255
+# The first-child offset stored for leaves.
+NO_CHILDREN = -1
+
+
+def generate_array_board(max_depth: int, size: int) -> ArrayBlock:
+    """Return the root of a new array-backed game board with a depth of
+    <max_depth> and dimensions of <size> by <size>.
+
+    The board is generated exactly the way block.generate_board generates
+    one, so both produce the same board from the same random state.
+
+    >>> random.seed(148)
+    >>> b1 = generate_array_board(3, 750)
+    >>> from block import generate_board
+    >>> random.seed(148)
+    >>> b2 = generate_board(3, 750)
+    >>> b1 == b2
+    True
+    """
+    board = ArrayBoard(max_depth, size)
+    board.add_root(random.randrange(len(COLOUR_LIST)))
+    root = board.root()
+    root.smash()
+    return root
+
+
+class ArrayBoard:
+    """A Blocky board stored as a structure of arrays.
+
+    Node 0 is the root. The four children of a node are stored in four
+    consecutive slots, in the same order as Block.children, and the node
+    records the index of the first of them. Sibling groups are laid out in
+    the order the tree is built, so a freshly built or copied board is in
+    preorder.
+
+    Attributes
+    - size: The height and width of the whole board.
+    - max_depth: The deepest level allowed in the board.
+    - colours: The index into COLOUR_LIST of each leaf's colour, or NO_COLOUR
+               for nodes that have children.
+    - levels: The level of each node.
+    - first_child: The index of each node's first child, or NO_CHILDREN for
+                   leaves.
+
+    Representation Invariants:
+    - len(self.colours) == len(self.levels) == len(self.first_child)
+    - self.colours[i] == NO_COLOUR iff self.first_child[i] != NO_CHILDREN
+
+    Slots that are no longer reachable from the root (after a combine) are
+    left in place. create_copy drops them.
+    """
+    __slots__ = ('size', 'max_depth', 'colours', 'levels', 'first_child')
+    size: int
+    max_depth: int
+    colours: bytearray
+    levels: bytearray
+    first_child: array
+
+    def __init__(self, max_depth: int, size: int) -> None:
+        """Initialize an empty board with <max_depth> and dimensions <size>
+        by <size>.
+        """
+        self.size = size
+        self.max_depth = max_depth
+        self.colours = bytearray()
+        self.levels = bytearray()
+        self.first_child = array('i')
+
+    @classmethod
+    def from_block(cls, block: Block) -> ArrayBoard:
+        """Return a new ArrayBoard equivalent to the tree rooted at <block>.
+
+        Preconditions:
+        - block.level == 0
+        """
+        board = cls(block.max_depth, block.size)
+        board.add_root(_colour_index(block.colour))
+        pending = [(0, block)]
+        while pending:
+            index, node = pending.pop()
+            if node.children:
+                first = board.add_children(
+                    index, [_colour_index(child.colour)
+                            for child in node.children])
+                for i, child in enumerate(node.children):
+                    pending.append((first + i, child))
+        return board
+
+    def add_root(self, colour: int) -> None:
+        """Add the root node of this board, with the colour at index <colour>
+        of COLOUR_LIST.
+
+        Preconditions:
+        - This board has no nodes yet.
+        """
+        self.colours.append(colour)
+        self.levels.append(0)
+        self.first_child.append(NO_CHILDREN)
+
+    def add_children(self, parent: int, colours: list[int]) -> int:
+        """Give node <parent> four new leaf children with the given colour
+        indexes, and return the index of the first child.
+
+        Preconditions:
+        - len(colours) == 4
+        - node <parent> is a leaf
+        """
+        first = len(self.colours)
+        level = self.levels[parent] + 1
+        self.colours.extend(colours)
+        self.levels.extend((level, level, level, level))
+        self.first_child.extend((NO_CHILDREN,) * 4)
+        self.first_child[parent] = first
+        self.colours[parent] = NO_COLOUR
+        return first
+
+    def root(self) -> ArrayBlock:
+        """Return a handle to the root of this board.
+        """
+        return ArrayBlock(self, 0, (0, 0), self.size)
+
+    def node_count(self) -> int:
+        """Return the number of node slots in this board, including slots that
+        are no longer reachable from the root.
+        """
+        return len(self.colours)
+
+    def to_block(self) -> Block:
+        """Return a new Block tree equivalent to this board.
+        """
+        return to_block(self.root())
+
+    def permute_children(self, index: int, order: tuple[int, ...]) -> None:
+        """Reorder the children of node <index> so that new child i is the
+        old child order[i].
+        """
+        first = self.first_child[index]
+        colours = [self.colours[first + i] for i in order]
+        firsts = [self.first_child[first + i] for i in order]
+        self.colours[first:first + 4] = bytearray(colours)
+        self.first_child[first:first + 4] = array('i', firsts)
+
+    def copy_subtree(self, target: ArrayBoard, index: int,
+                      new_index: int) -> None:
+        """Copy the descendants of node <index> in this board to be the
+        descendants of node <new_index> in <target>, in preorder.
+        """
+        pending = [(index, new_index)]
+        while pending:
+            old, new = pending.pop()
+            first = self.first_child[old]
+            if first == NO_CHILDREN:
+                continue
+            new_first = target.add_children(
+                new, list(self.colours[first:first + 4]))
+            for i in range(3, -1, -1):
+                pending.append((first + i, new_first + i))
+
+
+class ArrayBlock:
+    """A handle to one node of an ArrayBoard.
+
+    An ArrayBlock offers the interface of a Block, but keeps no state of its
+    own besides where it is. Handles are cheap to create and are made on
+    demand by <children>, so any code that walks a Block tree from the root
+    can walk an ArrayBoard as well.
+
+    Attributes
+    - board: The board this node belongs to.
+    - index: The index of this node within <board>'s arrays.
+    - position: The (x, y) coordinates of the upper left corner of this node.
+    - size: The height and width of this node.
+
+    A handle's position is worked out when the handle is made, from the
+    handles above it. After its ancestors are swapped or rotated, get a new
+    handle from the root.
+    """
+    __slots__ = ('board', 'index', 'position', 'size')
+    board: ArrayBoard
+    index: int
+    position: tuple[int, int]
+    size: int
+
+    def __init__(self, board: ArrayBoard, index: int,
+                 position: tuple[int, int], size: int) -> None:
+        """Initialize a handle to node <index> of <board>, which is at
+        <position> and has dimensions <size> by <size>.
+        """
+        self.board = board
+        self.index = index
+        self.position = position
+        self.size = size
+
+    @property
+    def colour(self) -> tuple[int, int, int] | None:
+        """The colour of this node, or None if it has children.
+        """
+        colour = self.board.colours[self.index]
+        return None if colour == NO_COLOUR else COLOUR_LIST[colour]
+
+    @property
+    def level(self) -> int:
+        """The level of this node.
+        """
+        return self.board.levels[self.index]
+
+    @property
+    def max_depth(self) -> int:
+        """The deepest level allowed in this node's board.
+        """
+        return self.board.max_depth
+
+    @property
+    def children(self) -> list[ArrayBlock]:
+        """Handles to the four children of this node, in the same order as
+        Block.children, or an empty list if this node is a leaf.
+        """
+        first = self.board.first_child[self.index]
+        if first == NO_CHILDREN:
+            return []
+        size = self.child_size()
+        return [ArrayBlock(self.board, first + i, position, size)
+                for i, position in enumerate(self.children_positions())]
+
+    def __eq__(self, other: Block | ArrayBlock) -> bool:
+        """Return True iff this node and all its descendents are equivalent to
+        <other> and all its descendents.
+
+        <other> may be a Block or an ArrayBlock.
+        """
+        if not self.children and not other.children:
+            return (self.position == other.position
+                    and self.size == other.size
+                    and self.colour == other.colour
+                    and self.level == other.level
+                    and self.max_depth == other.max_depth)
+        elif len(self.children) != len(other.children):
+            return False
+        else:
+            return self.children == other.children
+
+    def child_size(self) -> int:
+        """Return the size of this node's children.
+        """
+        return round(self.size / 2.0)
+
+    def children_positions(self) -> list[tuple[int, int]]:
+        """Return the (x, y) coordinates of this node's four children, in the
+        same order as Block.children_positions.
+        """
+        x, y = self.position
+        size = self.child_size()
+        return [(x + size, y), (x, y), (x, y + size), (x + size, y + size)]
+
+    def smashable(self) -> bool:
+        """Return True iff this node can be smashed.
+        """
+        return (self.level != self.max_depth
+                and self.board.first_child[self.index] == NO_CHILDREN)
+
+    def smash(self) -> bool:
+        """Smash this node, as Block.smash does, and return True iff the smash
+        was performed.
+
+        The random numbers are drawn in the same order as Block.smash draws
+        them.
+        """
+        if not self.smashable():
+            return False
+        palette = range(len(COLOUR_LIST))
+        colours = [random.choice(palette) for _ in range(4)]
+        self.board.add_children(self.index, colours)
+        for child in self.children:
+            if random.random() < math.exp(-0.25 * child.level):
+                child.smash()
+        return True
+
+    def swap(self, direction: int) -> bool:
+        """Swap the children of this node, as Block.swap does.
+
+        Return True iff the swap was performed.
+
+        Precondition:
+        - <direction> is either (SWAP_VERT, SWAP_HORZ)
+        """
+        if self.board.first_child[self.index] == NO_CHILDREN:
+            return False
+        if direction == SWAP_HORZ:
+            self.board.permute_children(self.index, (1, 0, 3, 2))
+        elif direction == SWAP_VERT:
+            self.board.permute_children(self.index, (3, 2, 1, 0))
+        return True
+
+    def rotate(self, direction: int) -> bool:
+        """Rotate this node and all its descendents, as Block.rotate does.
+
+        Return True iff the rotation was performed.
+
+        Preconditions:
+        - direction in (ROT_CW, ROT_CCW)
+        """
+        board = self.board
+        if board.first_child[self.index] == NO_CHILDREN:
+            return False
+        if direction == ROT_CW:
+            order = (1, 2, 3, 0)
+        elif direction == ROT_CCW:
+            order = (3, 0, 1, 2)
+        else:
+            return True
+        pending = [self.index]
+        while pending:
+            index = pending.pop()
+            board.permute_children(index, order)
+            first = board.first_child[index]
+            for child in range(first, first + 4):
+                if board.first_child[child] != NO_CHILDREN:
+                    pending.append(child)
+        return True
+
+    def paint(self, colour: tuple[int, int, int]) -> bool:
+        """Change this node's colour iff it is a leaf at a level of max_depth
+        and its colour is different from <colour>.
+
+        Return True iff this node's colour was changed.
+        """
+        new_colour = _colour_index(colour)
+        if self.level == self.max_depth \
+                and self.board.colours[self.index] != new_colour:
+            self.board.colours[self.index] = new_colour
+            return True
+        return False
+
+    def combine(self) -> bool:
+        """Turn this node into a leaf of the majority colour of its children,
+        as Block.combine does.
+
+        Return True iff this node was turned into a leaf.
+        """
+        board = self.board
+        first = board.first_child[self.index]
+        if first == NO_CHILDREN or any(
+                board.first_child[child] != NO_CHILDREN
+                for child in range(first, first + 4)):
+            return False
+        colour = majority(board.colours[first:first + 4])
+        if colour is None:
+            return False
+        board.colours[self.index] = colour
+        board.first_child[self.index] = NO_CHILDREN
+        return True
+
+    def create_copy(self) -> ArrayBlock:
+        """Return the root of a new, compact ArrayBoard holding a copy of this
+        node and its descendents.
+
+        >>> block = generate_array_board(3, 750)
+        >>> copy = block.create_copy()
+        >>> copy.board is not block.board
+        True
+        >>> block == copy
+        True
+        """
+        board = ArrayBoard(self.max_depth, self.size)
+        board.colours.append(self.board.colours[self.index])
+        board.levels.append(self.level)
+        board.first_child.append(NO_CHILDREN)
+        self.board.copy_subtree(board, self.index, 0)
+        return ArrayBlock(board, 0, self.position, self.size)
+
+
+def _colour_index(colour: tuple[int, int, int] | None) -> int:
+    """Return the index of <colour> in COLOUR_LIST, or NO_COLOUR if <colour>
+    is None.
+    """
+    return NO_COLOUR if colour is None else COLOUR_LIST.index(colour)
+
+
+if __name__ == '__main__':
+    import python_ta
+
+    python_ta.check_all(config={
+        'allowed-import-modules': [
+            'doctest', 'python_ta', 'random', 'typing', '__future__', 'math',
+            'array', 'block', 'settings'
+        ],
+        'max-attributes': 15,
+        'max-args': 6
+    })
+
+    import doctest
+
+    doctest.testmod()
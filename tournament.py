@@ -0,0 +1,239 @@
+"""CSC148 Assignment 2
+
+CSC148 Winter 2024
+Department of Computer Science,
+University of Toronto
+
+This code is provided solely for the personal and private use of
+students taking the CSC148 course at the University of Toronto.
+Copying for purposes other than this use is expressly prohibited.
+All forms of distribution of this code, whether as given or with
+any changes, are expressly prohibited.
+
+Authors: Diane Horton, David Liu, Mario Badr, Sophia Huynh, Misha Schwartz,
+Jaisie Sin, and Joonho Kim
+
+All of the files in this directory and all subdirectories are:
+Copyright (c) Diane Horton, David Liu, Mario Badr, Sophia Huynh,
+Misha Schwartz, Jaisie Sin, and Joonho Kim
+
+Module Description:
+
+This file contains a headless game engine, which plays games between
+computer players without a display, and a tournament runner, which plays
+many such games in parallel and sums up how each player did.
+"""
+from __future__ import annotations
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+from typing import Any
+import json
+import os
+import random
+import statistics
+import subprocess
+import sys
+import time
+
+from actions import PASS
+from block import generate_board
+from goal import score_all
+from player import create_players
+
+# The width and height of the boards games are played on.
+BOARD_SIZE = 750
+
+
+def player_kinds(num_random: int, smart_players: list[int]) -> list[str]:
+    """Return a description of each player in a game created with
+    <num_random> RandomPlayers and a SmartPlayer for each difficulty in
+    <smart_players>, in the order of their ids.
+
+    >>> player_kinds(1, [3, 5])
+    ['random', 'smart(3)', 'smart(5)']
+    """
+    return ['random'] * num_random \
+        + [f'smart({difficulty})' for difficulty in smart_players]
+
+
+def play_game(seed: int, num_random: int, smart_players: list[int],
+              max_depth: int, num_turns: int) -> dict[str, Any]:
+    """Play one game between <num_random> RandomPlayers and a SmartPlayer for
+    each difficulty in <smart_players>, on a board of <max_depth>, and
+    return its result.
+
+    Each of <num_turns> turns, every player makes one move, in the order of
+    their ids. A move that cannot be performed, or a player that finds no
+    move, counts as a pass. A player's final score is its goal's score less
+    the penalties of the moves it performed.
+
+    random is seeded with <seed> first, so the same <seed> always gives the
+    same game.
+
+    Return a dictionary with:
+    - 'seed': <seed>
+    - 'scores': each player's final score, in the order of their ids
+    - 'winners': the ids of the players with the highest final score
+    - 'moves': the number of moves made, passes included
+    - 'seconds': the time spent choosing and making moves
+
+    Preconditions:
+    - 1 <= num_random + len(smart_players) <= len(settings.COLOUR_LIST)
+    - max_depth >= 0
+    - num_turns >= 0
+
+    >>> first = play_game(148, 1, [5], 3, 4)
+    >>> second = play_game(148, 1, [5], 3, 4)
+    >>> first['scores'] == second['scores'], first['moves']
+    (True, 8)
+    """
+    random.seed(seed)
+    board = generate_board(max_depth, BOARD_SIZE)
+    players = create_players(0, num_random, smart_players)
+    moves = 0
+    start = time.perf_counter()
+    for _ in range(num_turns):
+        for player in players:
+            player.proceed()
+            move = player.generate_move(board)
+            moves += 1
+            if move is None:
+                continue
+            action, block = move
+            if action is not PASS \
+                    and action.apply(block, {'colour': player.goal.colour}):
+                player.penalty += action.penalty
+    seconds = time.perf_counter() - start
+
+    goal_scores = score_all(board, [player.goal for player in players])
+    scores = [goal_scores[player.goal] - player.penalty for player in players]
+    return {'seed': seed,
+            'scores': scores,
+            'winners': [i for i in range(len(scores))
+                        if scores[i] == max(scores)],
+            'moves': moves,
+            'seconds': seconds}
+
+
+def summarize(results: list[dict[str, Any]],
+              kinds: list[str]) -> dict[str, Any]:
+    """Return a summary of <results>, the results of play_game for games
+    between players described by <kinds>.
+
+    A game won by k players at once counts as 1/k of a win for each of
+    them. Moves per second is the total number of moves over the total time
+    spent on them, which does not count time waiting for other processes.
+
+    Preconditions:
+    - len(results) >= 1
+    """
+    players = []
+    for i, kind in enumerate(kinds):
+        scores = [result['scores'][i] for result in results]
+        wins = sum(1 / len(result['winners']) for result in results
+                   if i in result['winners'])
+        players.append({
+            'id': i,
+            'kind': kind,
+            'win_rate': wins / len(results),
+            'score': {'mean': statistics.mean(scores),
+                      'stdev': statistics.pstdev(scores),
+                      'min': min(scores),
+                      'median': statistics.median(scores),
+                      'max': max(scores)}
+        })
+    moves = sum(result['moves'] for result in results)
+    seconds = sum(result['seconds'] for result in results)
+    return {'games': len(results),
+            'players': players,
+            'moves': moves,
+            'moves_per_second': moves / seconds if seconds else 0.0}
+
+
+def run_tournament(num_games: int, num_random: int, smart_players: list[int],
+                   max_depth: int = 4, num_turns: int = 5, seed: int = 0,
+                   workers: int | None = None) -> dict[str, Any]:
+    """Play <num_games> games with the players, <max_depth> and <num_turns>
+    described in play_game, and return the summary from summarize.
+
+    Game i is played with the seed <seed> + i, so a tournament always has
+    the same results, however its games are shared between processes. The
+    games are played in a pool of <workers> processes, or one per CPU if
+    <workers> is None, or in this process if <workers> is 1.
+
+    Preconditions:
+    - num_games >= 1
+    - workers is None or workers >= 1
+    """
+    seeds = range(seed, seed + num_games)
+    args = (seeds, repeat(num_random), repeat(smart_players),
+            repeat(max_depth), repeat(num_turns))
+    if workers == 1:
+        results = list(map(play_game, *args))
+    else:
+        workers = workers or os.cpu_count() or 1
+        with ProcessPoolExecutor(workers) as pool:
+            results = list(pool.map(
+                play_game, *args,
+                chunksize=max(1, num_games // (4 * workers))))
+    return summarize(results, player_kinds(num_random, smart_players))
+
+
+def cold_start(module: str = 'player', runs: int = 5) -> dict[str, Any]:
+    """Return how long a new worker process takes to start and import
+    <module>, the median of <runs> runs.
+
+    Return a dictionary with:
+    - 'module': <module>
+    - 'seconds': the median time to start Python and import <module>
+    - 'import_seconds': that time less the median time to start Python
+      without importing anything
+    - 'pygame_imported': whether importing <module> imported pygame
+
+    Preconditions:
+    - runs >= 1
+    """
+    here = os.path.dirname(os.path.abspath(__file__))
+    code = f'import sys, {module}; print("pygame" in sys.modules)'
+
+    def median_time(command: str) -> tuple[float, str]:
+        """Return the median time taken to run <command> in a new Python
+        interpreter, and what the last run printed.
+        """
+        times = []
+        output = ''
+        for _ in range(runs):
+            start = time.perf_counter()
+            output = subprocess.run([sys.executable, '-c', command], cwd=here,
+                                    capture_output=True, text=True,
+                                    check=True).stdout
+            times.append(time.perf_counter() - start)
+        return statistics.median(times), output
+
+    seconds, output = median_time(code)
+    baseline, _ = median_time('pass')
+    return {'module': module,
+            'seconds': seconds,
+            'import_seconds': seconds - baseline,
+            'pygame_imported': output.strip().endswith('True')}
+
+
+if __name__ == '__main__':
+    import python_ta
+
+    python_ta.check_all(config={
+        'allowed-import-modules': [
+            'doctest', 'python_ta', 'random', 'typing', '__future__',
+            'concurrent.futures', 'itertools', 'json', 'os', 'statistics',
+            'subprocess', 'sys', 'time', 'actions', 'block', 'goal', 'player'
+        ],
+        'max-args': 7
+    })
+
+    import doctest
+
+    doctest.testmod()
+
+    print(json.dumps({'cold_start': cold_start(),
+                      'tournament': run_tournament(100, 1, [5, 20])},
+                     indent=2))